@@ -1,10 +1,18 @@
 from fastapi import Header, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import Optional
+import hmac
 import os
 
-from database import get_db
+from database import get_db, get_async_db, read_router, async_read_router, wants_primary
 from models import Merchant
+from utils.auth_cache import credential_cache
+from utils.read_your_writes import wrote_recently, wrote_recently_async
+
+# Shared token for process-wide ops endpoints (e.g. /admin/auth-cache).
+# Unset: those endpoints are disabled.
+OPS_API_TOKEN = os.getenv("OPS_API_TOKEN")
 
 def authenticate(
     x_api_key: Optional[str] = Header(None, alias="X-Api-Key"),
@@ -16,6 +24,12 @@ def authenticate(
             return db.query(Merchant).first()
         raise HTTPException(status_code=401, detail="Missing API credentials")
 
+    # Fast path: previously verified credentials, no DB round trip.
+    # Routers only read plain columns, so a transient Merchant is enough.
+    cached = credential_cache.get(x_api_key, x_api_secret)
+    if cached:
+        return Merchant(**cached)
+
     merchant = (
         db.query(Merchant)
         .filter(
@@ -36,4 +50,105 @@ def authenticate(
             }
         )
 
-    return merchant
\ No newline at end of file
+    credential_cache.put(x_api_key, x_api_secret, _cache_entry(merchant))
+
+    return merchant
+
+
+def get_merchant_read_db(
+    merchant=Depends(authenticate),
+    read_your_writes: Optional[str] = Header(None, alias="X-Read-Your-Writes"),
+):
+    """
+    get_read_db for merchant endpoints: also stays on the primary for a few
+    seconds after the merchant's own writes (see utils.read_your_writes).
+    """
+    primary = wants_primary(read_your_writes) or wrote_recently(merchant.id)
+    db = read_router.session(primary=primary)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def require_ops_token(
+    x_ops_token: Optional[str] = Header(None, alias="X-Ops-Token"),
+):
+    """
+    For endpoints that report on the whole process rather than one
+    merchant, so merchant API credentials are not enough.
+    """
+    if not OPS_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_ops_token or not hmac.compare_digest(x_ops_token, OPS_API_TOKEN):
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "error": {
+                    "code": "FORBIDDEN_ERROR",
+                    "description": "Invalid ops token"
+                }
+            }
+        )
+
+
+async def authenticate_async(
+    x_api_key: Optional[str] = Header(None, alias="X-Api-Key"),
+    x_api_secret: Optional[str] = Header(None, alias="X-Api-Secret"),
+    db=Depends(get_async_db),
+):
+    if not x_api_key or not x_api_secret:
+        if os.getenv("TEST_MODE") == "true":
+            result = await db.execute(select(Merchant).limit(1))
+            return result.scalars().first()
+        raise HTTPException(status_code=401, detail="Missing API credentials")
+
+    cached = credential_cache.get(x_api_key, x_api_secret)
+    if cached:
+        return Merchant(**cached)
+
+    result = await db.execute(
+        select(Merchant).where(
+            Merchant.api_key == x_api_key,
+            Merchant.api_secret == x_api_secret
+        )
+    )
+    merchant = result.scalars().first()
+
+    if not merchant:
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "error": {
+                    "code": "AUTHENTICATION_ERROR",
+                    "description": "Invalid API credentials"
+                }
+            }
+        )
+
+    credential_cache.put(x_api_key, x_api_secret, _cache_entry(merchant))
+
+    return merchant
+
+
+async def get_merchant_read_db_async(
+    merchant=Depends(authenticate_async),
+    read_your_writes: Optional[str] = Header(None, alias="X-Read-Your-Writes"),
+):
+    """
+    get_merchant_read_db for the async routers.
+    """
+    from utils.async_redis import redis_client
+
+    primary = wants_primary(read_your_writes) or await wrote_recently_async(redis_client, merchant.id)
+    async with await async_read_router.session(primary=primary) as db:
+        yield db
+
+
+def _cache_entry(merchant) -> dict:
+    return {
+        "id": merchant.id,
+        "email": merchant.email,
+        "api_key": merchant.api_key,
+        "webhook_secret": merchant.webhook_secret,
+    }
@@ -0,0 +1,80 @@
+"""
+Sanity check for GET /admin/stats against a real Postgres.
+
+Inserts a throwaway merchant with payments in every status spelling the
+workers write ("success", "failed", "PROCESSING", the reconciler's
+"FAILED", the legacy "SUCCESS"), calls the endpoint function on that
+session, checks the counts and that p50 / p95 latency are non-zero, and
+rolls everything back.
+
+    DATABASE_URL=... python -m benchmarks.admin_stats_check
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+
+from database import SessionLocal
+from models import Merchant, Order, Payment
+from routers.admin import admin_stats
+from utils import generate_id
+
+# status → (count, seconds from created_at to updated_at)
+FIXTURES = {
+    "success": (8, 2.0),
+    "SUCCESS": (2, 4.0),
+    "failed": (3, 1.0),
+    "FAILED": (1, 300.0),
+    "PROCESSING": (2, 0.5),
+}
+
+
+def seed(db) -> Merchant:
+    merchant = Merchant(
+        id=generate_id("mrc_"),
+        email=f"{generate_id('stats_')}@check.local",
+        api_key=generate_id("key_"),
+        api_secret=generate_id("secret_"),
+    )
+    db.add(merchant)
+    db.flush()
+
+    created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    for status, (count, latency) in FIXTURES.items():
+        for _ in range(count):
+            order = Order(
+                id=generate_id("order_"), merchant_id=merchant.id,
+                amount=100, currency="INR", receipt=generate_id("rcpt_"),
+            )
+            db.add(order)
+            db.flush()
+            db.add(Payment(
+                id=generate_id("pay_"), order_id=order.id, merchant_id=merchant.id,
+                amount=100, currency="INR", method="upi", status=status,
+                created_at=created_at, updated_at=created_at + timedelta(seconds=latency),
+            ))
+    db.flush()
+    return merchant
+
+
+def main() -> int:
+    db = SessionLocal()
+    try:
+        stats = admin_stats(merchant=seed(db), db=db)
+    finally:
+        db.rollback()
+        db.close()
+
+    payments, latency = stats["payments"], stats["latency_sec"]
+    problems = []
+    if (payments["success"], payments["failed"], payments["processing"]) != (10, 4, 2):
+        problems.append(f"counts {payments}")
+    if not (latency["p50"] > 0 and latency["p95"] > 0):
+        problems.append(f"percentiles are zero: {latency}")
+
+    print(stats)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
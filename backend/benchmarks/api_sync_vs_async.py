@@ -0,0 +1,154 @@
+"""
+Sync vs async API hot-path benchmark.
+
+Starts two uvicorn processes from this directory (ASYNC_API=false and
+ASYNC_API=true) against the DATABASE_URL / REDIS_URL in the environment,
+or targets already running servers via --sync-url / --async-url, then
+drives the same scenarios against both and prints requests/sec and
+latency percentiles.
+
+    python -m benchmarks.api_sync_vs_async --concurrency 64 --duration 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+API_PREFIX = "/api/v1"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def start_server(port: int, async_api: bool):
+    env = dict(os.environ, ASYNC_API="true" if async_api else "false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+def wait_healthy(base_url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{base_url} did not become healthy")
+
+
+def prepare_fixtures(base_url: str) -> dict:
+    creds = requests.get(f"{base_url}{API_PREFIX}/test/merchant", timeout=5).json()
+    headers = {"X-Api-Key": creds["api_key"], "X-Api-Secret": creds["api_secret"]}
+
+    order = requests.post(
+        f"{base_url}{API_PREFIX}/orders",
+        json={"amount": 50000, "currency": "INR", "receipt": "bench"},
+        headers=headers, timeout=5,
+    ).json()
+    payment = requests.post(
+        f"{base_url}{API_PREFIX}/payments",
+        json={"order_id": order["id"], "method": "upi", "vpa": "bench@upi"},
+        headers=headers, timeout=5,
+    ).json()
+    return {"headers": headers, "order_id": order["id"], "payment_id": payment["id"]}
+
+
+def scenarios(fx: dict) -> dict:
+    return {
+        "POST /orders": ("post", "/orders", {"amount": 50000, "currency": "INR", "receipt": "bench"}, True),
+        "POST /payments": ("post", "/payments", {"order_id": fx["order_id"], "method": "upi", "vpa": "bench@upi"}, True),
+        "POST /payments/public": ("post", "/payments/public", {"order_id": fx["order_id"], "method": "upi", "vpa": "bench@upi"}, False),
+        "GET /payments/{id}": ("get", f"/payments/{fx['payment_id']}", None, True),
+        "GET /payments/public/{id}": ("get", f"/payments/public/{fx['payment_id']}", None, False),
+    }
+
+
+def run_scenario(base_url, fx, spec, concurrency, duration):
+    method, path, body, authed = spec
+    url = f"{base_url}{API_PREFIX}{path}"
+    headers = fx["headers"] if authed else {}
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        local, local_errors = [], 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                resp = session.request(method, url, json=body, headers=headers, timeout=30)
+                if resp.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sync-url")
+    parser.add_argument("--async-url")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    procs = []
+    targets = {"sync": args.sync_url, "async": args.async_url}
+    for port, (mode, url) in zip((18001, 18002), list(targets.items())):
+        if not url:
+            procs.append(start_server(port, async_api=(mode == "async")))
+            targets[mode] = f"http://127.0.0.1:{port}"
+
+    try:
+        results = {}
+        for mode, base_url in targets.items():
+            wait_healthy(base_url)
+            fx = prepare_fixtures(base_url)
+            for name, spec in scenarios(fx).items():
+                results[(name, mode)] = run_scenario(base_url, fx, spec, args.concurrency, args.duration)
+
+        print(f"\nconcurrency={args.concurrency} duration={args.duration}s\n")
+        print(f"{'scenario':28} {'mode':6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for (name, mode), r in sorted(results.items()):
+            print(f"{name:28} {mode:6} {r['rps']:9.1f} {r['p50_ms']:9.1f} {r['p99_ms']:9.1f} {r['errors']:7d}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
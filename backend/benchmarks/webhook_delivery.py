@@ -0,0 +1,109 @@
+"""
+Webhook delivery benchmark against a local mock receiver.
+
+Compares the old path (sequential requests.post, new connection per
+delivery) with WebhookDeliveryEngine (pooled keep-alive aiohttp) driven
+by N concurrent worker threads. Prints deliveries/sec and how many TCP
+connections the receiver had to accept.
+
+    python -m benchmarks.webhook_delivery --deliveries 2000 --concurrency 32 --latency-ms 20
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.webhook_delivery import WebhookDeliveryEngine
+
+BODY = '{"event":"payment.success","data":{"payment":{"id":"pay_bench","amount":50000}}}'
+HEADERS = {"Content-Type": "application/json", "X-Webhook-Signature": "bench"}
+
+
+class MockReceiver(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with MockReceiver.lock:
+            MockReceiver.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def start_receiver(latency_ms: float):
+    MockReceiver.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockReceiver)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+
+def bench_baseline(url: str, deliveries: int):
+    ok = 0
+    started = time.perf_counter()
+    for _ in range(deliveries):
+        resp = requests.post(url, data=BODY, headers=HEADERS, timeout=5)
+        ok += resp.status_code == 200
+    return ok, time.perf_counter() - started
+
+
+def bench_engine(url: str, deliveries: int, concurrency: int):
+    engine = WebhookDeliveryEngine(max_connections_per_host=concurrency)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: engine.post(url, BODY, HEADERS), range(deliveries)))
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.close()
+    return sum(r.ok for r in results), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deliveries", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=10)
+    parser.add_argument("--baseline-deliveries", type=int, default=None,
+                        help="deliveries for the sequential baseline (default: same as --deliveries)")
+    args = parser.parse_args()
+
+    server, url = start_receiver(args.latency_ms)
+    try:
+        rows = []
+
+        MockReceiver.connections = 0
+        n = args.baseline_deliveries or args.deliveries
+        ok, elapsed = bench_baseline(url, n)
+        rows.append(("requests.post (sequential)", n, ok, elapsed, MockReceiver.connections))
+
+        MockReceiver.connections = 0
+        ok, elapsed = bench_engine(url, args.deliveries, args.concurrency)
+        rows.append((f"engine (concurrency={args.concurrency})", args.deliveries, ok, elapsed, MockReceiver.connections))
+
+        print(f"\nreceiver latency={args.latency_ms}ms\n")
+        print(f"{'mode':32} {'sent':>6} {'ok':>6} {'deliveries/s':>13} {'connections':>12}")
+        for mode, sent, ok, elapsed, conns in rows:
+            print(f"{mode:32} {sent:6d} {ok:6d} {sent / elapsed:13.1f} {conns:12d}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
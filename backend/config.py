@@ -6,6 +6,9 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 PORT = int(os.getenv("PORT", 8000))
 
+# Serve the hot endpoints from the async (asyncpg + redis.asyncio) routers
+ASYNC_API = os.getenv("ASYNC_API", "false").lower() == "true"
+
 TEST_MODE = os.getenv("TEST_MODE", "false").lower() == "true"
 TEST_PAYMENT_SUCCESS = os.getenv("TEST_PAYMENT_SUCCESS", "true").lower() == "true"
 TEST_PROCESSING_DELAY = int(os.getenv("TEST_PROCESSING_DELAY", "1000"))
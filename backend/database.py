@@ -1,10 +1,163 @@
-from sqlalchemy import create_engine
+from fastapi import Header
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
+import time
+import uuid
+import logging
+import threading
+from typing import Optional
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Streaming replica for read-only endpoints (optional)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Reads go to the primary while the replica is further behind than this
+REPLICA_MAX_LAG_SEC = float(os.getenv("REPLICA_MAX_LAG_SEC", "2"))
+REPLICA_LAG_CHECK_SEC = float(os.getenv("REPLICA_LAG_CHECK_SEC", "1"))
 
-engine = create_engine(DATABASE_URL)
+# -----------------------------
+# Engine factory
+# -----------------------------
+# Which process this is: picks the pool profile below and shows up as
+# application_name in pg_stat_activity.
+DB_ROLE = os.getenv("DB_ROLE", "api")
+
+# PgBouncer (transaction pooling): no startup `options`, no session state
+# and no server-side prepared statements that outlive a transaction.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+DB_POOL_TIMEOUT_SEC = float(os.getenv("DB_POOL_TIMEOUT_SEC", "10"))
+# Checkouts waiting longer than this are logged
+DB_POOL_SLOW_CHECKOUT_MS = float(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+
+# pool_size / max_overflow / statement timeout per role; DB_POOL_SIZE,
+# DB_MAX_OVERFLOW and DB_STATEMENT_TIMEOUT_MS override the profile.
+POOL_PROFILES = {
+    "api": {"pool_size": 10, "max_overflow": 20, "statement_timeout_ms": 5000},
+    # one session per in-flight payment
+    "payment_worker": {
+        "pool_size": int(os.getenv("WORKER_CONCURRENCY", "1")) + 2,
+        "max_overflow": 4,
+        "statement_timeout_ms": 10000,
+    },
+    "refund_worker": {"pool_size": 2, "max_overflow": 2, "statement_timeout_ms": 30000},
+    # sessions only for claim / record, never across HTTP calls
+    "webhook_worker": {"pool_size": 4, "max_overflow": 4, "statement_timeout_ms": 10000},
+    # bulk UPDATE ... RETURNING chunks and retention purges
+    "reconciliation_worker": {"pool_size": 2, "max_overflow": 1, "statement_timeout_ms": 60000},
+    # one-off schema migrations; 0 disables the timeout
+    "migrate": {"pool_size": 1, "max_overflow": 0, "statement_timeout_ms": 0},
+}
+
+
+class PoolStats:
+    """
+    Time spent waiting for a pooled connection (includes opening a new
+    one when the pool grows).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+        self.slow_checkouts = 0
+
+    def observe(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_sec += waited
+            self.wait_max_sec = max(self.wait_max_sec, waited)
+            if waited * 1000 >= DB_POOL_SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+        if waited * 1000 >= DB_POOL_SLOW_CHECKOUT_MS:
+            logging.warning(f"DB pool checkout waited {waited * 1000:.0f}ms ({DB_ROLE})")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(self.wait_total_sec * 1000 / self.checkouts, 2) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_sec * 1000, 2),
+                "slow_checkouts": self.slow_checkouts,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_settings(role: str = DB_ROLE) -> dict:
+    profile = POOL_PROFILES.get(role, POOL_PROFILES["api"])
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", profile["pool_size"])),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", profile["max_overflow"])),
+        "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", profile["statement_timeout_ms"])),
+    }
+
+
+def _set_local_statement_timeout(engine, timeout_ms: int):
+    # PgBouncer drops startup options; SET LOCAL only lasts for the
+    # transaction, so nothing leaks to the next client of the server connection
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def make_engine(role: str = DB_ROLE, url: str = None):
+    settings = pool_settings(role)
+    application_name = f"gateway-{role}"
+
+    connect_args = {"application_name": application_name}
+    if not DB_PGBOUNCER:
+        connect_args["options"] = f"-c statement_timeout={settings['statement_timeout_ms']}"
+
+    engine = create_engine(
+        url or DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=DB_POOL_TIMEOUT_SEC,
+        pool_recycle=DB_POOL_RECYCLE_SEC,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+    if DB_PGBOUNCER:
+        _set_local_statement_timeout(engine, settings["statement_timeout_ms"])
+    return engine
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool
+    return {
+        "role": DB_ROLE,
+        "pgbouncer": DB_PGBOUNCER,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        **pool_stats.snapshot(),
+    }
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -13,4 +166,225 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# -----------------------------
+# Read replica routing
+# -----------------------------
+# 0 when the replica has replayed everything it received, otherwise the
+# age of the last replayed transaction. NULL (not a standby) counts as 0.
+REPLICA_LAG_SQL = text("""
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END, 0)
+""")
+
+
+class ReadRouter:
+    """
+    Hands read-only endpoints a replica session, or a primary session when
+    no replica is configured, the caller asked to read its own writes, or
+    the replica lags more than REPLICA_MAX_LAG_SEC (or can't be reached).
+    The lag is measured at most once per REPLICA_LAG_CHECK_SEC per process.
+    """
+
+    def __init__(self, replica_engine=None):
+        self.replica_engine = replica_engine
+        self.ReplicaSession = sessionmaker(bind=replica_engine) if replica_engine is not None else None
+        self._lock = threading.Lock()
+        self._lag = None
+        self._checked_at = 0.0
+
+    def replica_lag(self) -> Optional[float]:
+        with self._lock:
+            if time.monotonic() - self._checked_at < REPLICA_LAG_CHECK_SEC:
+                return self._lag
+            self._checked_at = time.monotonic()
+        try:
+            with self.replica_engine.connect() as conn:
+                lag = float(conn.execute(REPLICA_LAG_SQL).scalar())
+        except Exception as e:
+            logging.warning(f"Replica lag check failed, reading from primary: {e}")
+            lag = None
+        with self._lock:
+            self._lag = lag
+        return lag
+
+    def use_replica(self) -> bool:
+        if self.ReplicaSession is None:
+            return False
+        lag = self.replica_lag()
+        return lag is not None and lag <= REPLICA_MAX_LAG_SEC
+
+    def session(self, primary: bool = False):
+        if not primary and self.use_replica():
+            return self.ReplicaSession()
+        return SessionLocal()
+
+    def is_replica(self, db) -> bool:
+        return self.replica_engine is not None and db.get_bind() is self.replica_engine
+
+    def status(self) -> dict:
+        if self.ReplicaSession is None:
+            return {"configured": False}
+        lag = self.replica_lag()
+        return {
+            "configured": True,
+            "lag_sec": lag,
+            "max_lag_sec": REPLICA_MAX_LAG_SEC,
+            "serving_reads": lag is not None and lag <= REPLICA_MAX_LAG_SEC,
+        }
+
+
+read_router = ReadRouter(make_engine(url=DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None)
+
+
+def wants_primary(header: Optional[str]) -> bool:
+    return (header or "").lower() in ("1", "true", "yes")
+
+
+def get_read_db(
+    read_your_writes: Optional[str] = Header(None, alias="X-Read-Your-Writes"),
+):
+    """
+    For read-only endpoints. `X-Read-Your-Writes: true` pins the request
+    to the primary, e.g. a GET right after the POST that created the row.
+    """
+    db = read_router.session(primary=wants_primary(read_your_writes))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# -----------------------------
+# Async engine (ASYNC_API=true)
+# -----------------------------
+# Created lazily so the sync deployment does not need asyncpg installed.
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def _async_database_url(url: str) -> str:
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def make_async_engine(role: str = DB_ROLE, url: str = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = pool_settings(role)
+    connect_args = {"server_settings": {"application_name": f"gateway-{role}"}}
+    if DB_PGBOUNCER:
+        # asyncpg prepares every statement; keep them uniquely named and uncached
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+        )
+    else:
+        connect_args["server_settings"]["statement_timeout"] = str(settings["statement_timeout_ms"])
+
+    async_engine = create_async_engine(
+        url or os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL),
+        poolclass=TimedAsyncQueuePool,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=DB_POOL_TIMEOUT_SEC,
+        pool_recycle=DB_POOL_RECYCLE_SEC,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+    if DB_PGBOUNCER:
+        _set_local_statement_timeout(async_engine.sync_engine, settings["statement_timeout_ms"])
+    return async_engine
+
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = make_async_engine()
+        _AsyncSessionLocal = async_sessionmaker(bind=_async_engine, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+class AsyncReadRouter:
+    """
+    ReadRouter for the async routers: same rules, with the replica engine
+    created lazily on asyncpg and the lag measured without blocking the
+    event loop.
+    """
+
+    def __init__(self, replica_url: Optional[str] = None):
+        self.replica_url = replica_url
+        self.replica_engine = None
+        self.ReplicaSession = None
+        self._lag = None
+        self._checked_at = 0.0
+
+    def _sessionmaker(self):
+        if self.ReplicaSession is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            self.replica_engine = make_async_engine(url=_async_database_url(self.replica_url))
+            self.ReplicaSession = async_sessionmaker(bind=self.replica_engine, expire_on_commit=False)
+        return self.ReplicaSession
+
+    async def replica_lag(self) -> Optional[float]:
+        # One event loop, no await before the timestamp is taken: only one
+        # request per interval runs the check
+        if time.monotonic() - self._checked_at < REPLICA_LAG_CHECK_SEC:
+            return self._lag
+        self._checked_at = time.monotonic()
+        self._sessionmaker()
+        try:
+            async with self.replica_engine.connect() as conn:
+                lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar())
+        except Exception as e:
+            logging.warning(f"Replica lag check failed, reading from primary: {e}")
+            lag = None
+        self._lag = lag
+        return lag
+
+    async def use_replica(self) -> bool:
+        if not self.replica_url:
+            return False
+        lag = await self.replica_lag()
+        return lag is not None and lag <= REPLICA_MAX_LAG_SEC
+
+    async def session(self, primary: bool = False):
+        if not primary and await self.use_replica():
+            return self._sessionmaker()()
+        return get_async_sessionmaker()()
+
+    def is_replica(self, db) -> bool:
+        return self.replica_engine is not None and db.bind is self.replica_engine
+
+
+async_read_router = AsyncReadRouter(DATABASE_REPLICA_URL)
+
+
+async def get_read_db_async(
+    read_your_writes: Optional[str] = Header(None, alias="X-Read-Your-Writes"),
+):
+    async with await async_read_router.session(primary=wants_primary(read_your_writes)) as db:
+        yield db
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if async_read_router.replica_engine is not None:
+        await async_read_router.replica_engine.dispose()
@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
-from database import Base, engine
+from config import ASYNC_API
 from routers import (
     health, merchants, orders, public_orders, payment,
     public_payments, test, test_jobs, admin, refunds, jobs,
@@ -13,9 +13,21 @@ app = FastAPI(title="Payment Gateway API", version="1.0.0")
 
 @app.on_event("startup")
 def startup_db():
-    Base.metadata.create_all(bind=engine)
-    from migrate import migrate
-    migrate()
+    # Only reads the migration ledger unless this build adds migrations
+    from migrate import ensure_schema
+    ensure_schema()
+    from utils.auth_cache import start_invalidation_listener
+    start_invalidation_listener()
+    from utils.idempotency import start_persist_writer
+    start_persist_writer()
+
+if ASYNC_API:
+    @app.on_event("shutdown")
+    async def shutdown_async_clients():
+        from database import dispose_async_engine
+        from utils.async_redis import close_redis
+        await dispose_async_engine()
+        await close_redis()
 
 if os.getenv("TEST_MODE") == "true":
     from fastapi.responses import JSONResponse
@@ -48,6 +60,10 @@ app.add_middleware(
 # Routers
 app.include_router(health.router) # Root health check for evaluation
 app.include_router(health.router, prefix="/api/v1")
+if ASYNC_API:
+    # Registered first so the async hot-path handlers win route matching
+    from routers import async_hot_path
+    app.include_router(async_hot_path.router, prefix="/api/v1")
 app.include_router(merchants.router, prefix="/api/v1")
 app.include_router(public_orders.router, prefix="/api/v1") # Match specific first
 app.include_router(orders.router, prefix="/api/v1")
@@ -1,62 +1,187 @@
 from sqlalchemy import text
-from database import engine
+from database import engine, make_engine, Base
+import os
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("migration")
 
+# -----------------------------
+# Config
+# -----------------------------
+# Apply pending migrations at startup (under the advisory lock). With
+# "false", a process on an outdated schema refuses to start instead and
+# migrations are run once per deploy with `python migrate.py`.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+# Direct (non-PgBouncer) URL for migrations; defaults to DATABASE_URL
+MIGRATION_DATABASE_URL = os.getenv("MIGRATION_DATABASE_URL")
+
+# pg_advisory_lock key; every process that migrates takes the same one
+MIGRATION_LOCK_ID = 72_001_025
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+)
+"""
+
+
+# =====================================================
+# Migrations (append only; never edit an applied one)
+# =====================================================
+def m0001_create_tables(conn):
+    import models  # noqa: F401  registers every table on Base
+    Base.metadata.create_all(bind=conn)
+
+
+def m0002_legacy_columns(conn):
+    # Databases created before these columns were in the models
+    for stmt in [
+        "ALTER TABLE merchants ADD COLUMN IF NOT EXISTS webhook_secret VARCHAR",
+        "ALTER TABLE refunds ADD COLUMN IF NOT EXISTS merchant_id VARCHAR",
+        "ALTER TABLE refunds ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS merchant_id VARCHAR",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS event VARCHAR",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS payload JSON",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS status VARCHAR DEFAULT 'pending'",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS response_code INTEGER",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS response_body VARCHAR",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS last_attempt_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS next_retry_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS webhook_id VARCHAR REFERENCES webhooks(id)",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS lease_owner VARCHAR",
+        "ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS merchant_id VARCHAR",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS error_code VARCHAR",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS error_description VARCHAR",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR",
+        "ALTER TABLE payments ADD COLUMN IF NOT EXISTS captured BOOLEAN DEFAULT FALSE",
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS currency VARCHAR(3) DEFAULT 'INR'",
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS notes JSON",
+    ]:
+        conn.execute(text(stmt))
+
+
+def m0003_indexes(conn):
+    for stmt in [
+        "CREATE INDEX IF NOT EXISTS idx_webhook_logs_webhook_id ON webhook_logs (webhook_id)",
+        "CREATE INDEX IF NOT EXISTS idx_webhook_logs_pending_due ON webhook_logs (next_retry_at) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_webhook_logs_merchant_created ON webhook_logs (merchant_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_merchant_created ON payments (merchant_id, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_merchant_status_created ON payments (merchant_id, status, created_at DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_processing_updated ON payments (updated_at) WHERE status = 'PROCESSING'",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys (expires_at)",
+    ]:
+        conn.execute(text(stmt))
+
+
+def m0004_payments_refunded_amount(conn):
+    conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS refunded_amount INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE payments p SET refunded_amount = r.total "
+        "FROM (SELECT payment_id, SUM(amount) AS total FROM refunds "
+        "WHERE status != 'FAILED' GROUP BY payment_id) r "
+        "WHERE p.id = r.payment_id"
+    ))
+
+
+def m0005_link_legacy_records(conn):
+    # Rows written before multi-merchant support belong to the first merchant
+    result = conn.execute(text("SELECT id FROM merchants LIMIT 1")).fetchone()
+    if result:
+        first_mrc_id = result[0]
+        conn.execute(text("UPDATE orders SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
+        conn.execute(text("UPDATE webhook_logs SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
+        conn.execute(text("UPDATE payments SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
+        conn.execute(text("UPDATE refunds SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
+        conn.execute(text("UPDATE webhook_logs SET event = 'payment.success' WHERE event IS NULL"))
+        conn.execute(text("UPDATE webhook_logs SET status = 'success' WHERE status IS NULL"))
+        conn.execute(text("UPDATE webhook_logs SET attempts = 0 WHERE attempts IS NULL"))
+
+
+def m0006_metrics_payments_created(conn):
+    conn.execute(text(
+        "ALTER TABLE merchant_metrics_minute ADD COLUMN IF NOT EXISTS payments_created INTEGER NOT NULL DEFAULT 0"
+    ))
+
+
+MIGRATIONS = [
+    (1, "create_tables", m0001_create_tables),
+    (2, "legacy_columns", m0002_legacy_columns),
+    (3, "indexes", m0003_indexes),
+    (4, "payments_refunded_amount", m0004_payments_refunded_amount),
+    (5, "link_legacy_records", m0005_link_legacy_records),
+    (6, "metrics_payments_created", m0006_metrics_payments_created),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# -----------------------------
+# Ledger
+# -----------------------------
+def current_version(conn) -> int:
+    if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+
 def migrate():
-    logger.info("Starting database migration...")
-    with engine.begin() as conn:
-        # 1. Merchants
-        logger.info("Checking 'merchants'...")
-        conn.execute(text("ALTER TABLE merchants ADD COLUMN IF NOT EXISTS webhook_secret VARCHAR"))
-        
-        # 2. Refunds
-        logger.info("Checking 'refunds'...")
-        conn.execute(text("ALTER TABLE refunds ADD COLUMN IF NOT EXISTS merchant_id VARCHAR"))
-        conn.execute(text("ALTER TABLE refunds ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE"))
-        
-        # 3. WebhookLogs
-        logger.info("Checking 'webhook_logs'...")
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS merchant_id VARCHAR"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS event VARCHAR"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS payload JSON"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS status VARCHAR DEFAULT 'pending'"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS response_code INTEGER"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS response_body VARCHAR"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS last_attempt_at TIMESTAMP WITH TIME ZONE"))
-        conn.execute(text("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS next_retry_at TIMESTAMP WITH TIME ZONE"))
-        
-        # 4. Payments
-        logger.info("Checking 'payments'...")
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS merchant_id VARCHAR"))
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS error_code VARCHAR"))
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS error_description VARCHAR"))
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE"))
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR"))
-        conn.execute(text("ALTER TABLE payments ADD COLUMN IF NOT EXISTS captured BOOLEAN DEFAULT FALSE"))
-        
-        # 5. Orders
-        logger.info("Checking 'orders'...")
-        conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS currency VARCHAR(3) DEFAULT 'INR'"))
-        conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS notes JSON"))
-
-        # 6. Data Cleanup
-        logger.info("Linking legacy records to first merchant...")
-        result = conn.execute(text("SELECT id FROM merchants LIMIT 1")).fetchone()
-        if result:
-            first_mrc_id = result[0]
-            conn.execute(text("UPDATE orders SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
-            conn.execute(text("UPDATE webhook_logs SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
-            conn.execute(text("UPDATE webhook_logs SET event = 'payment.success' WHERE event IS NULL"))
-            conn.execute(text("UPDATE webhook_logs SET status = 'success' WHERE status IS NULL"))
-            conn.execute(text("UPDATE webhook_logs SET attempts = 0 WHERE attempts IS NULL"))
-            conn.execute(text("UPDATE payments SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
-            conn.execute(text("UPDATE refunds SET merchant_id = :mrc_id WHERE merchant_id IS NULL"), {"mrc_id": first_mrc_id})
-
-    logger.info("Migrations completed successfully.")
+    """
+    Apply every migration newer than the ledger, each in its own
+    transaction, while holding the advisory lock so concurrent starters
+    wait and then find nothing left to do.
+    """
+    # No statement_timeout: backfills and index builds may take a while.
+    # Session advisory locks need a direct connection, not PgBouncer.
+    migration_engine = make_engine("migrate", url=MIGRATION_DATABASE_URL)
+    try:
+        with migration_engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+            try:
+                with conn.begin():
+                    conn.execute(text(LEDGER_DDL))
+                    version = current_version(conn)
+
+                for number, name, apply in MIGRATIONS:
+                    if number <= version:
+                        continue
+                    logger.info(f"Applying migration {number:04d}_{name}...")
+                    with conn.begin():
+                        apply(conn)
+                        conn.execute(
+                            text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                            {"version": number, "name": name},
+                        )
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                conn.commit()
+    finally:
+        migration_engine.dispose()
+
+    logger.info(f"Schema at version {LATEST_VERSION}.")
+
+
+def ensure_schema():
+    """
+    Startup check: one indexed read when the schema is current, so cold
+    starts and rolling deploys take no table locks.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this build needs {LATEST_VERSION}; run `python migrate.py`"
+        )
+    migrate()
+
 
 if __name__ == "__main__":
     migrate()
@@ -6,4 +6,5 @@ from .idempotency import IdempotencyKey
 from .refund import Refund
 from .webhook import Webhook
 from .webhook_log import WebhookLog
-from .reconciliation import PaymentLog
\ No newline at end of file
+from .reconciliation import PaymentLog
+from .metrics import MerchantMetricMinute
\ No newline at end of file
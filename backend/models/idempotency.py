@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, UniqueConstraint, JSON
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, UniqueConstraint, JSON, Index
 from sqlalchemy.sql import func
 from database import Base
 import uuid
@@ -20,4 +20,6 @@ class IdempotencyKey(Base):
 
     __table_args__ = (
         UniqueConstraint("merchant_id", "key", name="uq_merchant_idem_key"),
+        # Retention purge walks expired rows oldest-first
+        Index("idx_idempotency_keys_expires_at", "expires_at"),
     )
\ No newline at end of file
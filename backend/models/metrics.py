@@ -0,0 +1,38 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, ForeignKey
+from database import Base
+
+# Upper bounds (seconds) of the payment latency histogram; slower
+# payments land in latency_gt_60s.
+LATENCY_BUCKETS_SEC = (1, 2, 5, 10, 30, 60)
+
+
+class MerchantMetricMinute(Base):
+    """
+    Per-merchant, per-minute counters, incremented by the API and the
+    workers in the same transaction as the state change they count.
+    """
+    __tablename__ = "merchant_metrics_minute"
+
+    merchant_id = Column(String, ForeignKey("merchants.id"), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)  # minute start, UTC
+
+    payments_created = Column(Integer, nullable=False, default=0)
+    payments_success = Column(Integer, nullable=False, default=0)
+    payments_failed = Column(Integer, nullable=False, default=0)
+
+    refunds_processed = Column(Integer, nullable=False, default=0)
+    refund_amount = Column(BigInteger, nullable=False, default=0)
+
+    webhooks_delivered = Column(Integer, nullable=False, default=0)
+    webhooks_failed = Column(Integer, nullable=False, default=0)
+    webhook_retries = Column(Integer, nullable=False, default=0)
+
+    # Payment latency (created → final status)
+    latency_sum_ms = Column(BigInteger, nullable=False, default=0)
+    latency_le_1s = Column(Integer, nullable=False, default=0)
+    latency_le_2s = Column(Integer, nullable=False, default=0)
+    latency_le_5s = Column(Integer, nullable=False, default=0)
+    latency_le_10s = Column(Integer, nullable=False, default=0)
+    latency_le_30s = Column(Integer, nullable=False, default=0)
+    latency_le_60s = Column(Integer, nullable=False, default=0)
+    latency_gt_60s = Column(Integer, nullable=False, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.sql import func
 from database import Base
 import uuid
@@ -20,6 +20,10 @@ class Payment(Base):
 
     captured = Column(Boolean, nullable=False, default=False)
 
+    # Running total of non-failed refunds; only changed through
+    # utils.refund_balance.reserve_refund
+    refunded_amount = Column(Integer, nullable=False, default=0, server_default="0")
+
     idempotency_key = Column(String, nullable=True, unique=True, index=True)
 
     vpa = Column(String, nullable=True)
@@ -30,4 +34,12 @@ class Payment(Base):
     error_description = Column(String, nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Merchant transaction listing (keyset pagination, newest first)
+        Index("idx_payments_merchant_created", "merchant_id", created_at.desc(), id.desc()),
+        Index("idx_payments_merchant_status_created", "merchant_id", "status", created_at.desc(), id.desc()),
+        # Reconciliation sweep for stuck payments
+        Index("idx_payments_processing_updated", "updated_at", postgresql_where=text("status = 'PROCESSING'")),
+    )
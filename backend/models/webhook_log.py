@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, JSON, Index
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, JSON, Index, text
 from sqlalchemy.sql import func
 from database import Base
 import uuid
@@ -9,6 +9,8 @@ class WebhookLog(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     merchant_id = Column(String, ForeignKey("merchants.id"), nullable=False)
+    # Subscription this record delivers to (one log per event per webhook)
+    webhook_id = Column(String, ForeignKey("webhooks.id"), nullable=True)
 
     event = Column(String(50), nullable=False)
     payload = Column(JSON, nullable=False)
@@ -21,6 +23,10 @@ class WebhookLog(Base):
     last_attempt_at = Column(DateTime(timezone=True), nullable=True)
     next_retry_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Set while a worker is delivering this row; expired leases are reclaimable
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True),
@@ -30,6 +36,19 @@ class WebhookLog(Base):
 
     __table_args__ = (
         Index("idx_webhook_logs_merchant_id", "merchant_id"),
+        # Keyset pagination of a merchant's logs, newest first
+        Index(
+            "idx_webhook_logs_merchant_created",
+            "merchant_id",
+            created_at.desc(),
+            id.desc(),
+        ),
+        Index("idx_webhook_logs_webhook_id", "webhook_id"),
         Index("idx_webhook_logs_status", "status"),
         Index("idx_webhook_logs_next_retry_at", "next_retry_at"),
+        Index(
+            "idx_webhook_logs_pending_due",
+            "next_retry_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
     )
\ No newline at end of file
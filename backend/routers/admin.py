@@ -1,51 +1,72 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
+from sqlalchemy import func, select, case
 from models.payment import Payment
 from models.reconciliation import PaymentLog
-from models import Webhook, WebhookLog
-from auth import authenticate
-import statistics
+from models import WebhookLog
+from models.metrics import MerchantMetricMinute
+from utils.metrics import HISTOGRAM_COLUMNS
+from utils.errors import bad_request
+from datetime import datetime, timedelta, timezone
+from auth import authenticate, get_merchant_read_db, require_ops_token
+from utils.auth_cache import credential_cache
+from utils.retention import last_purge_report
+import redis, os
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+SUCCESS_STATUSES = ("success", "SUCCESS")
+FAILED_STATUSES = ("failed", "FAILED")
+PROCESSING_STATUSES = ("processing", "PROCESSING")
+
 
 @router.get("/stats")
-def admin_stats(merchant=Depends(authenticate), db: Session = Depends(get_db)):
+def admin_stats(merchant=Depends(authenticate), db: Session = Depends(get_merchant_read_db)):
     # -------------------------
-    # PAYMENTS OVERVIEW
+    # PAYMENTS OVERVIEW + LATENCY (one pass over the merchant's payments)
     # -------------------------
-    payments_total = db.query(Payment).filter(Payment.merchant_id == merchant.id).count()
-    payments_success = db.query(Payment).filter(Payment.merchant_id == merchant.id, Payment.status == "SUCCESS").count()
-    payments_failed = db.query(Payment).filter(Payment.merchant_id == merchant.id, Payment.status == "FAILED").count()
-    payments_processing = db.query(Payment).filter(Payment.merchant_id == merchant.id, Payment.status == "PROCESSING").count()
+    # Exact stored spellings (workers write lower case, the reconciler and
+    # the legacy processor upper case); no lower() on the column
+    succeeded = Payment.status.in_(SUCCESS_STATUSES)
+    latency = func.extract("epoch", Payment.updated_at - Payment.created_at)
+    # percentile_cont skips NULLs, so non-successful rows drop out of the percentiles
+    success_latency = case((succeeded, latency))
 
-    payment_success_rate = (payments_success / payments_total * 100) if payments_total else 0
-    payment_failure_rate = (payments_failed / payments_total * 100) if payments_total else 0
+    payments = db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(succeeded).label("success"),
+            func.count().filter(Payment.status.in_(FAILED_STATUSES)).label("failed"),
+            func.count().filter(Payment.status.in_(PROCESSING_STATUSES)).label("processing"),
+            func.coalesce(func.sum(Payment.amount).filter(succeeded), 0).label("success_amount"),
+            func.avg(latency).filter(succeeded).label("avg"),
+            func.min(latency).filter(succeeded).label("min"),
+            func.max(latency).filter(succeeded).label("max"),
+            func.percentile_cont(0.5).within_group(success_latency).label("p50"),
+            func.percentile_cont(0.95).within_group(success_latency).label("p95"),
+        ).where(Payment.merchant_id == merchant.id)
+    ).one()
 
-    # -------------------------
-    # PAYMENT LATENCY
-    # -------------------------
-    processed_payments = db.query(Payment).filter(
-        Payment.merchant_id == merchant.id,
-        Payment.status == "SUCCESS"
-    ).all()
-
-    latencies = [(p.updated_at - p.created_at).total_seconds() for p in processed_payments]
-    avg_latency = sum(latencies) / len(latencies) if latencies else 0
-    min_latency = min(latencies) if latencies else 0
-    max_latency = max(latencies) if latencies else 0
-    p50_latency = statistics.median(latencies) if latencies else 0
-    p95_latency = statistics.quantiles(latencies, n=100)[94] if len(latencies) >= 20 else (max(latencies) if latencies else 0)
+    payments_total = payments.total
+    payment_success_rate = (payments.success / payments_total * 100) if payments_total else 0
+    payment_failure_rate = (payments.failed / payments_total * 100) if payments_total else 0
 
     # -------------------------
     # WEBHOOKS OVERVIEW
     # -------------------------
-    webhooks_total = db.query(WebhookLog).join(Webhook).filter(Webhook.merchant_id == merchant.id).count()
-    webhooks_failed = db.query(WebhookLog).join(Webhook).filter(Webhook.merchant_id == merchant.id, WebhookLog.status == "failed").count()
-    webhook_retries = db.query(func.sum(WebhookLog.attempts)).join(Webhook).filter(Webhook.merchant_id == merchant.id).scalar() or 0
-    webhook_success_rate = ((webhooks_total - webhooks_failed) / webhooks_total * 100) if webhooks_total else 0
+    webhooks = db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(WebhookLog.status == "failed").label("failed"),
+            func.coalesce(func.sum(WebhookLog.attempts), 0).label("retries"),
+        ).where(WebhookLog.merchant_id == merchant.id)
+    ).one()
+
+    webhooks_total = webhooks.total
+    webhook_success_rate = ((webhooks_total - webhooks.failed) / webhooks_total * 100) if webhooks_total else 0
 
     # -------------------------
     # RETURN FULL STATS
@@ -53,23 +74,124 @@ def admin_stats(merchant=Depends(authenticate), db: Session = Depends(get_db)):
     return {
         "payments": {
             "total": payments_total,
-            "success": payments_success,
-            "failed": payments_failed,
-            "processing": payments_processing,
+            "success": payments.success,
+            "failed": payments.failed,
+            "processing": payments.processing,
+            "success_amount": payments.success_amount,
             "success_rate_pct": round(payment_success_rate, 2),
             "failure_rate_pct": round(payment_failure_rate, 2),
         },
         "webhooks": {
             "total": webhooks_total,
-            "failed": webhooks_failed,
-            "retries": webhook_retries,
+            "failed": webhooks.failed,
+            "retries": webhooks.retries,
             "success_rate_pct": round(webhook_success_rate, 2),
         },
         "latency_sec": {
-            "avg": round(avg_latency, 3),
-            "min": round(min_latency, 3),
-            "max": round(max_latency, 3),
-            "p50": round(p50_latency, 3),
-            "p95": round(p95_latency, 3),
+            "avg": round(float(payments.avg or 0), 3),
+            "min": round(float(payments.min or 0), 3),
+            "max": round(float(payments.max or 0), 3),
+            "p50": round(float(payments.p50 or 0), 3),
+            "p95": round(float(payments.p95 or 0), 3),
         }
-    }
\ No newline at end of file
+    }
+
+
+TIMESERIES_INTERVALS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+TIMESERIES_MAX_POINTS = 2000
+
+COUNTER_COLUMNS = [
+    "payments_created", "payments_success", "payments_failed",
+    "refunds_processed", "refund_amount",
+    "webhooks_delivered", "webhooks_failed", "webhook_retries",
+    "latency_sum_ms",
+] + HISTOGRAM_COLUMNS
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive timestamps are taken as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+@router.get("/stats/timeseries")
+def admin_stats_timeseries(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    interval: str = Query("hour"),
+    merchant=Depends(authenticate),
+    db: Session = Depends(get_merchant_read_db),
+):
+    """
+    Time-bucketed counters from the per-minute rollup (never the raw tables).
+    Defaults to the last 24 hours in hourly points.
+    """
+    if interval not in TIMESERIES_INTERVALS:
+        return bad_request(f"interval must be one of {', '.join(TIMESERIES_INTERVALS)}")
+
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        return bad_request("start must be before end")
+    if (end - start) / TIMESERIES_INTERVALS[interval] > TIMESERIES_MAX_POINTS:
+        return bad_request(f"Range too large for interval '{interval}' (max {TIMESERIES_MAX_POINTS} points)")
+
+    table = MerchantMetricMinute.__table__
+    period = func.date_trunc(interval, table.c.bucket).label("period")
+    rows = db.execute(
+        select(period, *[func.sum(table.c[column]).label(column) for column in COUNTER_COLUMNS])
+        .where(
+            table.c.merchant_id == merchant.id,
+            table.c.bucket >= start,
+            table.c.bucket < end,
+        )
+        .group_by(period)
+        .order_by(period)
+    ).mappings().all()
+
+    points = []
+    for row in rows:
+        success, failed = int(row["payments_success"]), int(row["payments_failed"])
+        payments = success + failed
+        timed = sum(int(row[column]) for column in HISTOGRAM_COLUMNS)
+        points.append({
+            "timestamp": row["period"].isoformat(),
+            "payments": {
+                "created": int(row["payments_created"]),
+                "total": payments,
+                "success": success,
+                "failed": failed,
+                "success_rate_pct": round(success / payments * 100, 2) if payments else 0,
+            },
+            "refunds": {
+                "processed": int(row["refunds_processed"]),
+                "amount": int(row["refund_amount"]),
+            },
+            "webhooks": {
+                "delivered": int(row["webhooks_delivered"]),
+                "failed": int(row["webhooks_failed"]),
+                "retries": int(row["webhook_retries"]),
+            },
+            "latency": {
+                "avg_sec": round(int(row["latency_sum_ms"]) / timed / 1000, 3) if timed else 0,
+                "histogram": {column.removeprefix("latency_"): int(row[column]) for column in HISTOGRAM_COLUMNS},
+            },
+        })
+
+    return {
+        "interval": interval,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "points": points,
+    }
+
+
+@router.get("/auth-cache", dependencies=[Depends(require_ops_token)])
+def auth_cache_stats():
+    # Process-wide (every merchant's lookups), so ops token only
+    return credential_cache.stats()
+
+
+@router.get("/retention", dependencies=[Depends(require_ops_token)])
+def retention_stats():
+    # Last idempotency_keys purge run by the reconciliation worker (process-wide, ops token only)
+    return {"idempotency_keys": last_purge_report(redis_client)}
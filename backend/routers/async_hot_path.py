@@ -0,0 +1,241 @@
+"""
+Async versions of the hot endpoints, mounted ahead of the sync routers
+when ASYNC_API=true. Behaviour and response shapes mirror the sync
+handlers in orders.py, payment.py, public_payments.py and refunds.py;
+only the I/O (asyncpg session, redis.asyncio client) differs, so no
+request holds a threadpool thread while it waits on Postgres or Redis.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import select
+import json, os
+
+from database import get_async_db, get_read_db_async, async_read_router
+from models import Order, Payment, Merchant, Refund
+from schemas import PaymentCreate, PaymentResponse, RefundCreate, RefundResponse
+from schemas.order import OrderCreate, OrderResponse
+from auth import authenticate_async, get_merchant_read_db_async
+from utils import generate_id
+from utils.errors import not_found
+from utils.async_redis import redis_client
+from utils.job_queue import get_queue
+from utils.metrics import record_metrics_async
+from utils.idempotency import IdempotentRequest
+from utils.payment_events import payment_event
+from utils.read_cache import get_or_load_async, prime_async
+from utils.refund_balance import reserve_refund, payment_exists
+from utils.read_your_writes import mark_write_async
+
+QUEUE_NAME = os.getenv("WORKER_QUEUE", "gateway_jobs")
+REFUND_QUEUE = os.getenv("REFUND_QUEUE", "gateway_refunds")
+
+payment_queue = get_queue(QUEUE_NAME)
+refund_queue = get_queue(REFUND_QUEUE)
+
+router = APIRouter(tags=["async"])
+
+
+async def _first(db, stmt):
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+
+# -----------------------------
+# CREATE ORDER (MERCHANT)
+# -----------------------------
+@router.post("/orders", response_model=OrderResponse, status_code=201)
+async def create_order(
+    data: OrderCreate,
+    merchant=Depends(authenticate_async),
+    db=Depends(get_async_db),
+):
+    if data.amount < 100:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": {
+                    "code": "BAD_REQUEST_ERROR",
+                    "description": "amount must be at least 100"
+                }
+            }
+        )
+
+    order = Order(
+        id=generate_id("order_"),
+        merchant_id=merchant.id,
+        amount=data.amount,
+        currency=data.currency,
+        receipt=data.receipt,
+        notes=data.notes,
+        status="created"
+    )
+
+    db.add(order)
+    await db.commit()
+    await mark_write_async(redis_client, merchant.id)
+    await db.refresh(order)
+    await prime_async("order", order.id, OrderResponse.from_orm(order).model_dump(mode="json"), redis_client)
+    return order
+
+
+# -----------------------------
+# CREATE PAYMENT (MERCHANT)
+# -----------------------------
+@router.post("/payments", response_model=PaymentResponse, status_code=201)
+async def create_payment(
+    data: PaymentCreate,
+    merchant=Depends(authenticate_async),
+    db=Depends(get_async_db),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    async with await IdempotentRequest(merchant.id, idempotency_key, data.dict()).begin_async(redis_client, db) as idem:
+        if idem.cached:
+            return idem.response()
+
+        order = await _first(db, select(Order).where(Order.id == data.order_id))
+        if not order:
+            not_found("Order not found")
+
+        payment = Payment(
+            id=generate_id("pay_"),
+            order_id=order.id,
+            merchant_id=merchant.id,
+            amount=order.amount,
+            currency=order.currency,
+            method=data.method,
+            status="pending",
+            captured=False,
+            vpa=data.vpa,
+            idempotency_key=idempotency_key,
+        )
+
+        db.add(payment)
+        await record_metrics_async(db, merchant.id, payments_created=1)
+        await db.commit()
+        await mark_write_async(redis_client, merchant.id)
+        await db.refresh(payment)
+        await prime_async("payment", payment.id, payment_event(payment), redis_client)
+
+        await payment_queue.enqueue_async(redis_client, json.dumps({"payment_id": payment.id}))
+
+        response_data = PaymentResponse.from_orm(payment).model_dump()
+        await idem.save_async(response_data, 201)
+
+    return response_data
+
+
+# -----------------------------
+# CREATE PUBLIC PAYMENT
+# -----------------------------
+@router.post("/payments/public", response_model=PaymentResponse, status_code=201)
+async def create_public_payment(
+    data: PaymentCreate,
+    db=Depends(get_async_db),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    order = await _first(db, select(Order).where(Order.id == data.order_id))
+    if not order:
+        not_found("Order not found")
+
+    merchant = await _first(db, select(Merchant).where(Merchant.id == order.merchant_id))
+    if not merchant:
+        not_found("Merchant not found")
+
+    payment = Payment(
+        id=generate_id("pay_"),
+        order_id=order.id,
+        merchant_id=merchant.id,
+        amount=order.amount,
+        currency=order.currency,
+        method=data.method,
+        status="CREATED",
+        captured=False,
+        vpa=data.vpa,
+        idempotency_key=idempotency_key,
+    )
+
+    db.add(payment)
+    await record_metrics_async(db, merchant.id, payments_created=1)
+    await db.commit()
+    await db.refresh(payment)
+    await prime_async("payment", payment.id, payment_event(payment), redis_client)
+
+    await payment_queue.enqueue_async(redis_client, json.dumps({"payment_id": payment.id}))
+
+    return PaymentResponse.from_orm(payment)
+
+
+# -----------------------------
+# GET PUBLIC PAYMENT STATUS
+# -----------------------------
+@router.get("/payments/public/{payment_id}", response_model=PaymentResponse)
+async def get_public_payment(payment_id: str, db=Depends(get_read_db_async)):
+    async def load():
+        payment = await _first(db, select(Payment).where(Payment.id == payment_id))
+        return payment_event(payment) if payment else None
+
+    payment = await get_or_load_async(
+        "payment", payment_id, load, redis_client, cache_missing=not async_read_router.is_replica(db)
+    )
+    if not payment:
+        raise HTTPException(404, "Payment not found")
+    return payment
+
+
+# -----------------------------
+# GET PAYMENT (MERCHANT)
+# -----------------------------
+@router.get("/payments/{payment_id}", response_model=PaymentResponse)
+async def get_payment(payment_id: str, merchant=Depends(authenticate_async), db=Depends(get_merchant_read_db_async)):
+    payment = await _first(
+        db,
+        select(Payment).where(Payment.id == payment_id, Payment.merchant_id == merchant.id)
+    )
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return payment
+
+
+# -----------------------------
+# CREATE REFUND
+# -----------------------------
+@router.post("/refunds", response_model=RefundResponse, status_code=201)
+async def create_refund(
+    data: RefundCreate,
+    merchant=Depends(authenticate_async),
+    db=Depends(get_async_db),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
+):
+    async with await IdempotentRequest(merchant.id, idempotency_key, data.dict()).begin_async(redis_client, db) as idem:
+        if idem.cached:
+            return idem.response()
+
+        result = await db.execute(reserve_refund(data.payment_id, merchant.id, data.amount))
+        if result.first() is None:
+            await db.rollback()
+            if (await db.execute(payment_exists(data.payment_id, merchant.id))).first() is None:
+                raise HTTPException(status_code=404, detail="Payment not found")
+            raise HTTPException(
+                status_code=400,
+                detail="Refund amount exceeds payment amount"
+            )
+
+        refund = Refund(
+            id=generate_id("refund_"),
+            payment_id=data.payment_id,
+            merchant_id=merchant.id,
+            amount=data.amount,
+            status="pending",
+            reason=data.reason
+        )
+
+        db.add(refund)
+        await db.commit()
+        await mark_write_async(redis_client, merchant.id)
+        await db.refresh(refund)
+
+        await refund_queue.enqueue_async(redis_client, json.dumps({"refund_id": refund.id}))
+
+        response_data = RefundResponse.from_orm(refund).dict()
+        await idem.save_async(response_data, 201)
+
+    return response_data
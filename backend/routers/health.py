@@ -1,19 +1,24 @@
 from fastapi import APIRouter
 from datetime import datetime
-from database import engine
+from sqlalchemy import text
+from database import engine, pool_status, read_router
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
     try:
-        engine.connect()
+        # Context manager returns the connection to the pool
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         db_status = "connected"
-    except:
+    except Exception:
         db_status = "disconnected"
 
     return {
         "status": "healthy",
         "database": db_status,
+        "pool": pool_status(engine),
+        "replica": read_router.status(),
         "timestamp": datetime.utcnow().isoformat() + "Z"
-    }
\ No newline at end of file
+    }
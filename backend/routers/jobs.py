@@ -2,6 +2,8 @@ from fastapi import APIRouter
 import redis
 import os
 
+from utils.job_queue import get_queue
+
 router = APIRouter(prefix="/jobs", tags=["Jobs"])
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
@@ -9,20 +11,34 @@ redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
 
 QUEUES = {
     "gateway_jobs": "pending",
-    "gateway_jobs_dlq": "dlq",
     "gateway_webhooks": "webhooks",
-    "gateway_webhooks_dlq": "webhooks_dlq",
     "gateway_refunds": "refunds",
+}
+
+# Dead-letter queues are always plain lists
+DLQS = {
+    "gateway_jobs_dlq": "dlq",
+    "gateway_webhooks_dlq": "webhooks_dlq",
     "gateway_refunds_dlq": "refunds_dlq",
 }
 
 
 @router.get("/health")
 def job_queue_health():
+    queues = {queue: get_queue(queue, client=redis_client).depth() for queue in QUEUES}
+    queues.update({queue: redis_client.llen(queue) for queue in DLQS})
     return {
         "status": "ok",
-        "queues": {
-            queue: redis_client.llen(queue)
-            for queue in QUEUES
-        },
-    }
\ No newline at end of file
+        "queues": queues,
+    }
+
+
+@router.get("/consumers")
+def job_queue_consumers():
+    """
+    Per-queue backlog and, on the stream backend, per-consumer pending/idle.
+    """
+    return {
+        queue: get_queue(queue, client=redis_client).stats()
+        for queue in QUEUES
+    }
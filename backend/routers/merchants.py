@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session
 from database import get_db
 from models import Merchant
 from utils import generate_id
+from utils.auth_cache import invalidate_merchant_credentials
+from utils.errors import not_found
+from auth import authenticate
 import secrets
 
 router = APIRouter(
@@ -26,4 +29,23 @@ def create_merchant(db: Session = Depends(get_db)):
 
 @router.get("", status_code=200)
 def list_merchants(db: Session = Depends(get_db)):
-    return db.query(Merchant).all()
\ No newline at end of file
+    return db.query(Merchant).all()
+
+
+@router.post("/rotate-keys", status_code=200)
+def rotate_merchant_keys(merchant=Depends(authenticate), db: Session = Depends(get_db)):
+    # TEST_MODE authenticate falls back to the first merchant, which may not exist
+    record = db.query(Merchant).filter(Merchant.id == merchant.id).first() if merchant else None
+    if record is None:
+        not_found("Merchant not found")
+    old_api_key = record.api_key
+
+    record.api_key = secrets.token_hex(16)
+    record.api_secret = secrets.token_hex(32)
+    db.commit()
+    db.refresh(record)
+
+    # Old credentials must stop working on every replica, not just this one
+    invalidate_merchant_credentials(old_api_key)
+
+    return record
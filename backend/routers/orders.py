@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Order, Payment
 from utils import generate_id
-from auth import authenticate
-from schemas.order import OrderCreate, OrderResponse
+from auth import authenticate, get_merchant_read_db
+from schemas.order import OrderCreate, OrderResponse, OrderBatchCreate, OrderBatchResponse
+from utils.metrics import record_metrics
+from utils.read_cache import invalidate, prime
+from utils.read_your_writes import mark_write
 
 router = APIRouter(
     prefix="/orders",
@@ -43,10 +47,79 @@ def create_order(
 
     db.add(order)
     db.commit()
+    mark_write(merchant.id)
     db.refresh(order)
+    # Checkout reads it through the public endpoint right away
+    prime("order", order.id, OrderResponse.from_orm(order).model_dump(mode="json"))
     return order
 
 
+# -----------------------------
+# CREATE ORDERS IN BATCH (MERCHANT)
+# -----------------------------
+def _order_error(data: OrderCreate):
+    if data.amount < 100:
+        return "amount must be at least 100"
+    if not data.receipt:
+        return "receipt is required"
+    if len(data.currency) != 3:
+        return "currency must be a 3-letter code"
+    return None
+
+
+@router.post("/batch", response_model=OrderBatchResponse)
+def create_orders_batch(
+    data: OrderBatchCreate,
+    merchant=Depends(authenticate),
+    db: Session = Depends(get_db)
+):
+    """
+    Validates every order first, then inserts the valid ones with one
+    multi-row INSERT ... RETURNING in a single transaction. Invalid items
+    are reported per index and do not block the rest. An empty or
+    oversized batch fails schema validation (422).
+    """
+    results = []
+    rows = []
+    for index, item in enumerate(data.orders):
+        error = _order_error(item)
+        if error:
+            results.append({
+                "index": index,
+                "error": {"code": "BAD_REQUEST_ERROR", "description": error},
+            })
+            continue
+        rows.append({
+            "id": generate_id("order_"),
+            "merchant_id": merchant.id,
+            "amount": item.amount,
+            "currency": item.currency,
+            "receipt": item.receipt,
+            "notes": item.notes,
+            "status": "created",
+        })
+        results.append({"index": index, "id": rows[-1]["id"]})
+
+    created = {}
+    if rows:
+        orders = db.scalars(insert(Order).returning(Order), rows).all()
+        # Serialize before commit: expired instances would reload one by one
+        created = {order.id: OrderResponse.from_orm(order) for order in orders}
+        db.commit()
+        mark_write(merchant.id)
+
+    for result in results:
+        order_id = result.pop("id", None)
+        if order_id:
+            result["order"] = created[order_id]
+
+    return {
+        "created": len(created),
+        "failed": len(results) - len(created),
+        "results": results,
+    }
+
+
 # -----------------------------
 # GET ORDER (MERCHANT)
 # -----------------------------
@@ -54,7 +127,7 @@ def create_order(
 def get_order(
     order_id: str,
     merchant=Depends(authenticate),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_merchant_read_db)
 ):
     order = db.query(Order).filter_by(
         id=order_id,
@@ -108,6 +181,7 @@ def create_payment(
     )
 
     db.add(payment)
+    record_metrics(db, merchant.id, payments_created=1)
     db.commit()
     db.refresh(payment)
 
@@ -116,8 +190,10 @@ def create_payment(
     order.status = "paid"
 
     db.commit()
+    mark_write(merchant.id)
     db.refresh(order)
     db.refresh(payment)
+    invalidate(payment_ids=[payment.id], order_ids=[order.id])
 
     return {
         "order_id": order.id,
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
 import json, redis
 from datetime import datetime
 
 from database import get_db
 from models import Payment, Order
-from schemas import PaymentCreate, PaymentResponse, CaptureRequest
-from auth import authenticate
+from schemas import PaymentCreate, PaymentResponse, PaymentPage, CaptureRequest
+from auth import authenticate, get_merchant_read_db
 from utils import generate_id
 from utils.errors import not_found
-from utils.idempotency import get_existing_response, save_idempotency_response
+from utils.job_queue import get_queue
+from utils.metrics import record_metrics
+from utils.idempotency import IdempotentRequest
+from utils.payment_events import payment_event
+from utils.pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.read_cache import invalidate, prime
+from utils.read_your_writes import mark_write
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
@@ -18,6 +24,8 @@ QUEUE_NAME = "gateway_jobs"
 WEBHOOK_QUEUE = "gateway_webhooks"
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+payment_queue = get_queue(QUEUE_NAME, client=redis_client)
+webhook_queue = get_queue(WEBHOOK_QUEUE, client=redis_client)
 
 
 @router.post("", response_model=PaymentResponse, status_code=201)
@@ -27,49 +35,75 @@ def create_payment(
     db: Session = Depends(get_db),
     idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
-    if idempotency_key:
-        cached = get_existing_response(db, merchant.id, idempotency_key, data.dict())
-        if cached:
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
-                content=cached["body"],
-                status_code=cached["status_code"]
-            )
-    order = db.query(Order).filter_by(id=data.order_id).first()
-    if not order:
-        not_found("Order not found")
-
-    payment = Payment(
-        id=generate_id("pay_"),
-        order_id=order.id,
-        merchant_id=merchant.id,
-        amount=order.amount,
-        currency=order.currency,
-        method=data.method,
-        status="pending",
-        captured=False,
-        vpa=data.vpa,
-        idempotency_key=idempotency_key,
-    )
-
-    db.add(payment)
-    db.commit()
-    db.refresh(payment)
-
-    redis_client.rpush(QUEUE_NAME, json.dumps({"payment_id": payment.id}))
-
-    # Prepare response for pydantic validation and saving
-    from schemas import PaymentResponse
-    response_data = PaymentResponse.from_orm(payment).model_dump()
-
-    if idempotency_key:
-        save_idempotency_response(db, merchant.id, idempotency_key, data.dict(), response_data, 201)
+    with IdempotentRequest(merchant.id, idempotency_key, data.dict()).begin(db) as idem:
+        if idem.cached:
+            return idem.response()
+
+        order = db.query(Order).filter_by(id=data.order_id).first()
+        if not order:
+            not_found("Order not found")
+
+        payment = Payment(
+            id=generate_id("pay_"),
+            order_id=order.id,
+            merchant_id=merchant.id,
+            amount=order.amount,
+            currency=order.currency,
+            method=data.method,
+            status="pending",
+            captured=False,
+            vpa=data.vpa,
+            idempotency_key=idempotency_key,
+        )
+
+        db.add(payment)
+        record_metrics(db, merchant.id, payments_created=1)
+        db.commit()
+        mark_write(merchant.id)
+        db.refresh(payment)
+        # Before enqueueing, so the worker's invalidation always lands after it
+        prime("payment", payment.id, payment_event(payment), redis_client)
+
+        payment_queue.enqueue(json.dumps({"payment_id": payment.id}))
+
+        # Prepare response for pydantic validation and saving
+        response_data = PaymentResponse.from_orm(payment).model_dump()
+        idem.save(response_data, 201)
 
     return response_data
 
 
+@router.get("", response_model=PaymentPage)
+def list_payments(
+    status: str | None = None,
+    method: str | None = None,
+    order_id: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    merchant=Depends(authenticate),
+    db: Session = Depends(get_merchant_read_db),
+):
+    # Served by idx_payments_merchant_created / idx_payments_merchant_status_created
+    query = db.query(Payment).filter(Payment.merchant_id == merchant.id)
+    if status:
+        query = query.filter(Payment.status == status)
+    if method:
+        query = query.filter(Payment.method == method)
+    if order_id:
+        query = query.filter(Payment.order_id == order_id)
+    if start:
+        query = query.filter(Payment.created_at >= start)
+    if end:
+        query = query.filter(Payment.created_at < end)
+
+    payments, next_cursor = keyset_page(query, Payment.created_at, Payment.id, cursor, limit)
+    return {"data": payments, "has_more": next_cursor is not None, "next_cursor": next_cursor}
+
+
 @router.get("/{payment_id}", response_model=PaymentResponse)
-def get_payment(payment_id: str, merchant=Depends(authenticate), db: Session = Depends(get_db)):
+def get_payment(payment_id: str, merchant=Depends(authenticate), db: Session = Depends(get_merchant_read_db)):
     payment = db.query(Payment).filter_by(id=payment_id, merchant_id=merchant.id).first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -84,65 +118,42 @@ def capture_payment(
     idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
     # 🔒 Idempotency check
-    if idempotency_key:
-        cached = get_existing_response(
-            db=db,
-            merchant_id=merchant.id,
-            idem_key=idempotency_key,
-            request_payload={"payment_id": payment_id, **payload.dict()},
-        )
-        if cached:
-            from fastapi.responses import JSONResponse
-            return JSONResponse(content=cached["body"], status_code=cached["status_code"])
-
-    payment = db.query(Payment).filter_by(
-        id=payment_id, merchant_id=merchant.id
-    ).first()
-
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
+    request_payload = {"payment_id": payment_id, **payload.dict()}
+    with IdempotentRequest(merchant.id, idempotency_key, request_payload).begin(db) as idem:
+        if idem.cached:
+            return idem.response()
+
+        payment = db.query(Payment).filter_by(
+            id=payment_id, merchant_id=merchant.id
+        ).first()
+
+        if not payment:
+            raise HTTPException(status_code=404, detail="Payment not found")
+
+        if payment.status != "success":
+            raise HTTPException(status_code=400, detail="Payment not in capturable state")
+
+        if payment.captured:
+            idem.save(PaymentResponse.from_orm(payment).dict(), 200)
+            return payment
+
+        payment.captured = True
+        payment.updated_at = datetime.utcnow()
+        db.commit()
+        mark_write(merchant.id)
+        db.refresh(payment)
+        invalidate(redis_client, payment_ids=[payment.id])
+
+        webhook_queue.enqueue(json.dumps({
+            "payment_id": payment.id,
+            "event_type": "payment.captured",
+            "order_id": payment.order_id,
+            "merchant_id": payment.merchant_id,
+            "amount": payment.amount,
+            "currency": payment.currency,
+            "method": payment.method,
+        }))
+
+        idem.save(PaymentResponse.from_orm(payment).dict(), 200)
 
-    if payment.status != "success":
-        raise HTTPException(status_code=400, detail="Payment not in capturable state")
-
-    if payment.captured:
-        response = PaymentResponse.from_orm(payment).dict()
-        if idempotency_key:
-            save_idempotency_response(
-                db,
-                merchant.id,
-                idempotency_key,
-                {"payment_id": payment_id, **payload.dict()},
-                response,
-                200,
-            )
-        return payment
-
-    payment.captured = True
-    payment.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(payment)
-
-    redis_client.rpush(WEBHOOK_QUEUE, json.dumps({
-        "payment_id": payment.id,
-        "event_type": "payment.captured",
-        "order_id": payment.order_id,
-        "merchant_id": payment.merchant_id,
-        "amount": payment.amount,
-        "currency": payment.currency,
-        "method": payment.method,
-    }))
-
-    response = PaymentResponse.from_orm(payment).dict()
-
-    if idempotency_key:
-        save_idempotency_response(
-            db,
-            merchant.id,
-            idempotency_key,
-            {"payment_id": payment_id, **payload.dict()},
-            response,
-            200,
-        )
-
-    return payment
\ No newline at end of file
+    return payment
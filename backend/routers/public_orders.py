@@ -4,9 +4,10 @@ import random
 import string
 import uuid
 
-from database import get_db
+from database import get_db, get_read_db, read_router
 from models import Order, Merchant
 from schemas.order import PublicOrderCreate, OrderResponse
+from utils.read_cache import get_or_load, prime
 
 router = APIRouter(
     prefix="/orders/public",
@@ -61,6 +62,7 @@ def create_public_order(
     db.add(order)
     db.commit()
     db.refresh(order)
+    prime("order", order.id, OrderResponse.from_orm(order).model_dump(mode="json"))
 
     return order
 
@@ -76,9 +78,14 @@ def list_public_orders(db: Session = Depends(get_db)):
 @router.get("/{order_id}", response_model=OrderResponse)
 def get_public_order(
     order_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    order = db.query(Order).filter(Order.id == order_id).first()
+    def load():
+        order = db.query(Order).filter(Order.id == order_id).first()
+        return OrderResponse.from_orm(order).model_dump(mode="json") if order else None
+
+    # Read-through cache; paid orders are cached for a long time
+    order = get_or_load("order", order_id, load, cache_missing=not read_router.is_replica(db))
     if not order:
         raise HTTPException(
             status_code=404,
@@ -1,18 +1,25 @@
 from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import redis, json, os
 
-from database import get_db
+from database import get_db, get_read_db, SessionLocal, read_router
 from models import Payment, Order, Merchant
 from schemas import PaymentCreate, PaymentResponse
 from utils import generate_id
 from utils.errors import not_found
+from utils.job_queue import get_queue
+from utils.metrics import record_metrics
+from utils.payment_events import payment_event, payment_event_hub, stream_payment_status
+from utils.read_cache import get_or_load, prime
 
 router = APIRouter(prefix="/payments/public", tags=["public-payments"])
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 QUEUE_NAME = os.getenv("WORKER_QUEUE", "gateway_jobs")
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+payment_queue = get_queue(QUEUE_NAME, client=redis_client)
 
 # -----------------------------
 # CREATE PUBLIC PAYMENT
@@ -45,11 +52,14 @@ def create_public_payment(
     )
 
     db.add(payment)
+    record_metrics(db, merchant.id, payments_created=1)
     db.commit()
     db.refresh(payment)
+    # Before enqueueing, so the worker's invalidation always lands after it
+    prime("payment", payment.id, payment_event(payment), redis_client)
 
     # enqueue async processing
-    redis_client.rpush(QUEUE_NAME, json.dumps({"payment_id": payment.id}))
+    payment_queue.enqueue(json.dumps({"payment_id": payment.id}))
 
     return PaymentResponse.from_orm(payment)
 
@@ -57,8 +67,49 @@ def create_public_payment(
 # GET PUBLIC PAYMENT STATUS
 # -----------------------------
 @router.get("/{payment_id}", response_model=PaymentResponse)
-def get_public_payment(payment_id: str, db: Session = Depends(get_db)):
-    payment = db.query(Payment).filter_by(id=payment_id).first()
+def get_public_payment(payment_id: str, db: Session = Depends(get_read_db)):
+    def load():
+        payment = db.query(Payment).filter_by(id=payment_id).first()
+        return payment_event(payment) if payment else None
+
+    # Read-through cache; workers invalidate on every status change
+    payment = get_or_load("payment", payment_id, load, cache_missing=not read_router.is_replica(db))
     if not payment:
         raise HTTPException(404, "Payment not found")
-    return PaymentResponse.from_orm(payment)
\ No newline at end of file
+    return payment
+
+
+# -----------------------------
+# STREAM PUBLIC PAYMENT STATUS (SSE)
+# -----------------------------
+def _load_payment_event(payment_id: str):
+    def load():
+        db = SessionLocal()
+        try:
+            payment = db.query(Payment).filter_by(id=payment_id).first()
+            return payment_event(payment) if payment else None
+        finally:
+            db.close()
+
+    return get_or_load("payment", payment_id, load)
+
+
+@router.get("/{payment_id}/events")
+async def stream_public_payment(payment_id: str):
+    """
+    Server-Sent Events: the current status immediately, then the final
+    status the moment the payment worker publishes it. One DB read per
+    connection instead of one per poll.
+    """
+    # Subscribe before reading so a change committed in between isn't missed
+    queue = await payment_event_hub.subscribe(payment_id)
+    current = await run_in_threadpool(_load_payment_event, payment_id)
+    if current is None:
+        payment_event_hub.unsubscribe(payment_id, queue)
+        raise HTTPException(404, "Payment not found")
+
+    return StreamingResponse(
+        stream_payment_status(payment_id, queue, current),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Payment, Refund
-from auth import authenticate
+from models import Refund
+from auth import authenticate, get_merchant_read_db
 from schemas.refund import RefundCreate, RefundResponse
 from utils import generate_id
-from utils.idempotency import get_existing_response, save_idempotency_response
+from utils.idempotency import IdempotentRequest
+from utils.job_queue import get_queue
+from utils.refund_balance import reserve_refund, payment_exists
+from utils.read_your_writes import mark_write
 import redis, os, json
 
 # -----------------------------
@@ -14,6 +17,7 @@ import redis, os, json
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 REFUND_QUEUE = os.getenv("REFUND_QUEUE", "gateway_refunds")
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+refund_queue = get_queue(REFUND_QUEUE, client=redis_client)
 
 router = APIRouter(prefix="/refunds", tags=["refunds"])
 
@@ -30,69 +34,53 @@ def create_refund(
 ):
     # -----------------------------
     # Idempotency: prevent double refund
+    # (concurrent duplicates wait for the first response)
     # -----------------------------
-    if idempotency_key:
-        cached = get_existing_response(db, merchant.id, idempotency_key, data.dict())
-        if cached:
-            from fastapi.responses import JSONResponse
-            return JSONResponse(content=cached["body"], status_code=cached["status_code"])
-
-    # -----------------------------
-    # Validate payment exists and belongs to merchant
-    # -----------------------------
-    payment = db.query(Payment).filter_by(
-        id=data.payment_id,
-        merchant_id=merchant.id
-    ).first()
-
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-
-    # Optional: prevent cumulative over-refund
-    refunded_total = (
-        db.query(Refund)
-        .filter(Refund.payment_id == payment.id, Refund.status != "FAILED")
-        .with_entities(func.coalesce(func.sum(Refund.amount), 0))
-        .scalar()
-    )
-
-    if data.amount + refunded_total > payment.amount:
-        raise HTTPException(
-            status_code=400,
-            detail="Refund amount exceeds payment amount"
+    with IdempotentRequest(merchant.id, idempotency_key, data.dict()).begin(db) as idem:
+        if idem.cached:
+            return idem.response()
+
+        # -----------------------------
+        # Reserve the amount on the payment row (prevents over-refund,
+        # including between concurrent requests)
+        # -----------------------------
+        if db.execute(reserve_refund(data.payment_id, merchant.id, data.amount)).first() is None:
+            db.rollback()
+            if db.execute(payment_exists(data.payment_id, merchant.id)).first() is None:
+                raise HTTPException(status_code=404, detail="Payment not found")
+            raise HTTPException(
+                status_code=400,
+                detail="Refund amount exceeds payment amount"
+            )
+
+        # -----------------------------
+        # Create refund record
+        # -----------------------------
+        refund = Refund(
+            id=generate_id("refund_"),
+            payment_id=data.payment_id,
+            merchant_id=merchant.id,
+            amount=data.amount,
+            status="pending",
+            reason=data.reason
         )
 
-    # -----------------------------
-    # Create refund record
-    # -----------------------------
-    refund = Refund(
-        id=generate_id("refund_"),
-        payment_id=payment.id,
-        merchant_id=merchant.id,
-        amount=data.amount,
-        status="pending",
-        reason=data.reason
-    )
+        # Same transaction as the reservation
+        db.add(refund)
+        db.commit()
+        mark_write(merchant.id)
+        db.refresh(refund)
 
-    db.add(refund)
-    db.commit()
-    db.refresh(refund)
+        # -----------------------------
+        # Enqueue async refund job
+        # -----------------------------
+        refund_queue.enqueue(json.dumps({"refund_id": refund.id}))
 
-    # -----------------------------
-    # Enqueue async refund job
-    # -----------------------------
-    redis_client.rpush(
-        REFUND_QUEUE,
-        json.dumps({"refund_id": refund.id})
-    )
-
-    # -----------------------------
-    # Save idempotency response
-    # -----------------------------
-    from schemas.refund import RefundResponse
-    response_data = RefundResponse.from_orm(refund).dict()
-    if idempotency_key:
-        save_idempotency_response(db, merchant.id, idempotency_key, data.dict(), response_data, 201)
+        # -----------------------------
+        # Save idempotency response
+        # -----------------------------
+        response_data = RefundResponse.from_orm(refund).dict()
+        idem.save(response_data, 201)
 
     return response_data
 
@@ -104,7 +92,7 @@ def create_refund(
 def get_refund(
     refund_id: str,
     merchant=Depends(authenticate),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_merchant_read_db)
 ):
     refund = db.query(Refund).filter_by(
         id=refund_id,
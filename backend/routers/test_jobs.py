@@ -3,9 +3,10 @@ import redis
 import os
 import json
 
-from database import SessionLocal
+from database import SessionLocal, read_router
 from models import Payment, Order, Merchant, Refund
 from utils import generate_id
+from utils.job_queue import get_queue
 
 router = APIRouter(prefix="/test/jobs", tags=["Jobs Test"])
 
@@ -13,6 +14,8 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 QUEUE_NAME = os.getenv("WORKER_QUEUE", "gateway_jobs")
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+payment_queue = get_queue(QUEUE_NAME, client=redis_client)
+refund_queue = get_queue("gateway_refunds", client=redis_client)
 
 
 @router.post("/enqueue")
@@ -58,10 +61,7 @@ def enqueue_test_job():
         db.commit()
         db.refresh(payment)
 
-        redis_client.rpush(
-            QUEUE_NAME,
-            json.dumps({"payment_id": payment.id}),
-        )
+        payment_queue.enqueue(json.dumps({"payment_id": payment.id}))
 
         return {
             "status": "queued",
@@ -88,15 +88,15 @@ def test_job_status():
     """
     try:
         redis_client.ping()
-        pending = redis_client.llen(QUEUE_NAME)
+        pending = payment_queue.depth()
         
-        db = SessionLocal()
+        db = read_router.session()
         try:
             processing = db.query(Payment).filter(Payment.status == "PROCESSING").count()
             completed = db.query(Payment).filter(Payment.status == "success").count()
             failed = db.query(Payment).filter(Payment.status == "failed").count()
             
-            refund_pending = redis_client.llen("gateway_refunds")
+            refund_pending = refund_queue.depth()
             refund_completed = db.query(Refund).filter(Refund.status == "processed").count()
         finally:
             db.close()
@@ -1,19 +1,23 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session, defer
 import json
 import redis
 import os
+from datetime import datetime
 
 from database import get_db
-from auth import authenticate
+from auth import authenticate, get_merchant_read_db
 from models.webhook_log import WebhookLog
-from schemas.webhook_log import WebhookLogResponse
+from schemas.webhook_log import WebhookLogPage
 from utils.errors import not_found
+from utils.job_queue import get_queue
+from utils.pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 QUEUE_NAME = os.getenv("WEBHOOK_QUEUE", "gateway_webhooks")
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+webhook_queue = get_queue(QUEUE_NAME, client=redis_client)
 
 router = APIRouter(prefix="/webhook-logs", tags=["webhook-logs"])
 
@@ -21,18 +25,35 @@ router = APIRouter(prefix="/webhook-logs", tags=["webhook-logs"])
 # -------------------------------------------------
 # GET webhook delivery logs (merchant dashboard)
 # -------------------------------------------------
-@router.get("", response_model=list[WebhookLogResponse])
+@router.get("", response_model=WebhookLogPage)
 def list_webhook_logs(
+    status: str | None = None,
+    event: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     merchant=Depends(authenticate),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_merchant_read_db),
 ):
-
-    return (
+    # Served by idx_webhook_logs_merchant_created (merchant_id, created_at DESC, id DESC)
+    # The event payload isn't part of the listing; don't read it off disk
+    query = (
         db.query(WebhookLog)
+        .options(defer(WebhookLog.payload))
         .filter(WebhookLog.merchant_id == merchant.id)
-        .order_by(WebhookLog.created_at.desc())
-        .all()
     )
+    if status:
+        query = query.filter(WebhookLog.status == status)
+    if event:
+        query = query.filter(WebhookLog.event == event)
+    if start:
+        query = query.filter(WebhookLog.created_at >= start)
+    if end:
+        query = query.filter(WebhookLog.created_at < end)
+
+    logs, next_cursor = keyset_page(query, WebhookLog.created_at, WebhookLog.id, cursor, limit)
+    return {"data": logs, "has_more": next_cursor is not None, "next_cursor": next_cursor}
 
 
 # -------------------------------------------------
@@ -67,4 +88,6 @@ def retry_webhook(
     
     db.commit()
 
+    webhook_queue.enqueue(json.dumps({"log_id": log.id}))
+
     return {"message": "Webhook retry scheduled"}
\ No newline at end of file
@@ -9,6 +9,7 @@ from models.webhook import Webhook
 from models.merchant import Merchant
 from auth import authenticate
 from utils.errors import bad_request, not_found
+from utils.circuit_breaker import get_endpoint_health, endpoint_for
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
@@ -38,4 +39,19 @@ def list_webhooks(
     merchant=Depends(authenticate),
     db: Session = Depends(get_db)
 ):
-    return db.query(Webhook).filter(Webhook.merchant_id == merchant.id, Webhook.active == True).all()
\ No newline at end of file
+    return db.query(Webhook).filter(Webhook.merchant_id == merchant.id, Webhook.active == True).all()
+
+@router.get("/health")
+def webhook_endpoint_health(
+    merchant=Depends(authenticate),
+    db: Session = Depends(get_db)
+):
+    """
+    Circuit breaker state of each endpoint this merchant delivers to.
+    """
+    webhooks = db.query(Webhook).filter(Webhook.merchant_id == merchant.id, Webhook.active == True).all()
+    health = {h["endpoint"]: h for h in get_endpoint_health([w.url for w in webhooks])}
+    return [
+        {"webhook_id": w.id, "url": w.url, **health[endpoint_for(w.url)]}
+        for w in webhooks
+    ]
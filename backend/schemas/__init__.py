@@ -1,13 +1,16 @@
-from .order import PublicOrderCreate, OrderCreate, OrderResponse
-from .payment import PaymentCreate, PaymentResponse, CaptureRequest
+from .order import PublicOrderCreate, OrderCreate, OrderResponse, OrderBatchCreate, OrderBatchResponse
+from .payment import PaymentCreate, PaymentResponse, PaymentPage, CaptureRequest
 from .refund import RefundCreate, RefundResponse
 
 __all__ = [
     "PublicOrderCreate",
     "OrderCreate",
     "OrderResponse",
+    "OrderBatchCreate",
+    "OrderBatchResponse",
     "PaymentCreate",
     "PaymentResponse",
+    "PaymentPage",
     "CaptureRequest",
     "RefundCreate",
     "RefundResponse",
@@ -1,6 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional, Dict
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
 from datetime import datetime
+import os
+
+# Orders per POST /orders/batch; larger bodies are rejected with a 422
+# before any of them is parsed into the handler
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", "1000"))
 
 # =========================
 # PUBLIC ORDER SCHEMA
@@ -23,6 +28,10 @@ class OrderCreate(BaseModel):
     notes: Optional[Dict[str, str]] = None
 
 
+class OrderBatchCreate(BaseModel):
+    orders: List[OrderCreate] = Field(..., min_length=1, max_length=ORDER_BATCH_MAX_SIZE)
+
+
 # =========================
 # RESPONSE SCHEMA
 # =========================
@@ -38,4 +47,16 @@ class OrderResponse(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class OrderBatchItem(BaseModel):
+    index: int
+    order: Optional[OrderResponse] = None
+    error: Optional[Dict[str, str]] = None
+
+
+class OrderBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItem]
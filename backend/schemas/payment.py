@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 class CardDetails(BaseModel):
@@ -35,4 +35,10 @@ class PaymentResponse(BaseModel):
     updated_at: Optional[datetime]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class PaymentPage(BaseModel):
+    data: List[PaymentResponse]
+    has_more: bool
+    next_cursor: Optional[str] = None
@@ -1,11 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
 # Request to create refund
 class RefundCreate(BaseModel):
     payment_id: str
-    amount: int
+    amount: int = Field(gt=0)
     reason: Optional[str] = None
 
 # Refund response
@@ -1,11 +1,12 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
 class WebhookLogResponse(BaseModel):
     id: str
     merchant_id: Optional[str]
+    webhook_id: Optional[str]
     event: Optional[str]
     status: Optional[str]
     attempts: int
@@ -16,4 +17,10 @@ class WebhookLogResponse(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class WebhookLogPage(BaseModel):
+    data: List[WebhookLogResponse]
+    has_more: bool
+    next_cursor: Optional[str] = None
@@ -0,0 +1,11 @@
+import os
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+# Shared by every async router; the connection pool lives on the event loop.
+redis_client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+async def close_redis():
+    await redis_client.aclose()
@@ -0,0 +1,141 @@
+import os
+import time
+import hmac
+import hashlib
+import threading
+from collections import OrderedDict
+
+import redis
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
+AUTH_CACHE_TTL_SEC = float(os.getenv("AUTH_CACHE_TTL_SEC", "60"))
+AUTH_INVALIDATION_CHANNEL = os.getenv("AUTH_INVALIDATION_CHANNEL", "merchant_credentials_invalidate")
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+class CredentialCache:
+    """
+    Bounded LRU + TTL cache of verified merchant credentials keyed by api_key.
+    Only a SHA-256 of the api_secret is kept in memory.
+    """
+
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl: float = AUTH_CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key: str, api_secret: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            secret_hash, merchant_data, expires_at = entry
+            if expires_at <= now:
+                del self._entries[api_key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            if not hmac.compare_digest(secret_hash, hash_secret(api_secret)):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(api_key)
+            self.hits += 1
+            return merchant_data
+
+    def put(self, api_key: str, api_secret: str, merchant_data: dict):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[api_key] = (hash_secret(api_secret), merchant_data, expires_at)
+            self._entries.move_to_end(api_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evict(self, api_key: str) -> bool:
+        with self._lock:
+            if self._entries.pop(api_key, None) is None:
+                return False
+            self.evictions += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate_pct": round(self.hits / lookups * 100, 2) if lookups else 0,
+            }
+
+
+credential_cache = CredentialCache()
+
+
+# -----------------------------
+# Cross-replica invalidation
+# -----------------------------
+def invalidate_merchant_credentials(api_key: str):
+    """
+    Evict locally and tell every other API replica to drop the entry.
+    """
+    credential_cache.evict(api_key)
+    try:
+        redis_client.publish(AUTH_INVALIDATION_CHANNEL, api_key)
+    except redis.RedisError as e:
+        print(f"⚠️ Failed to publish credential invalidation: {e}")
+
+
+def _invalidation_listener():
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+            # Messages published while we were disconnected are lost,
+            # so start from an empty cache after every (re)subscribe.
+            credential_cache.clear()
+            for message in pubsub.listen():
+                if message.get("type") == "message":
+                    credential_cache.evict(message["data"])
+        except Exception as e:
+            print(f"⚠️ Credential invalidation listener error: {e}")
+            time.sleep(1)
+
+
+_listener_started = False
+
+
+def start_invalidation_listener():
+    global _listener_started
+    if _listener_started:
+        return
+    _listener_started = True
+    threading.Thread(target=_invalidation_listener, daemon=True).start()
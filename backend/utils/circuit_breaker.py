@@ -0,0 +1,308 @@
+import os
+import time
+import socket
+import threading
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import redis
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+BREAKER_EWMA_ALPHA = float(os.getenv("BREAKER_EWMA_ALPHA", "0.2"))
+# Open when the error EWMA crosses this (after MIN_SAMPLES) or on N failures in a row
+BREAKER_ERROR_THRESHOLD = float(os.getenv("BREAKER_ERROR_THRESHOLD", "0.5"))
+BREAKER_MIN_SAMPLES = int(os.getenv("BREAKER_MIN_SAMPLES", "5"))
+BREAKER_MAX_CONSECUTIVE_FAILURES = int(os.getenv("BREAKER_MAX_CONSECUTIVE_FAILURES", "5"))
+# Cooldown doubles every time a half-open probe fails
+BREAKER_COOLDOWN_SEC = float(os.getenv("BREAKER_COOLDOWN_SEC", "30"))
+BREAKER_MAX_COOLDOWN_SEC = float(os.getenv("BREAKER_MAX_COOLDOWN_SEC", "600"))
+BREAKER_PROBE_TIMEOUT_SEC = int(os.getenv("BREAKER_PROBE_TIMEOUT_SEC", "30"))
+BREAKER_HALF_OPEN_RETRY_SEC = float(os.getenv("BREAKER_HALF_OPEN_RETRY_SEC", "10"))
+
+# Adaptive (AIMD) per-host concurrency
+HOST_CONCURRENCY_MAX = int(os.getenv("WEBHOOK_MAX_CONNECTIONS_PER_HOST", "10"))
+HOST_CONCURRENCY_MIN = 1
+HOST_LATENCY_TARGET_MS = float(os.getenv("WEBHOOK_HOST_LATENCY_TARGET_MS", "1000"))
+HOST_SHED_RETRY_SEC = float(os.getenv("WEBHOOK_HOST_SHED_RETRY_SEC", "2"))
+# Per-process limits not refreshed for this long (stopped workers) aren't reported
+HOST_LIMIT_REPORT_TTL_SEC = int(os.getenv("WEBHOOK_HOST_LIMIT_REPORT_TTL_SEC", "300"))
+
+KEY_PREFIX = "webhook_breaker"
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Atomic EWMA update + state transition, so several worker replicas
+# recording results for the same endpoint never lose each other's samples.
+RECORD_SCRIPT = """
+local h = KEYS[1]
+local err = tonumber(ARGV[1])
+local lat = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local alpha = tonumber(ARGV[4])
+local threshold = tonumber(ARGV[5])
+local min_samples = tonumber(ARGV[6])
+local max_consec = tonumber(ARGV[7])
+local base_cd = tonumber(ARGV[8])
+local max_cd = tonumber(ARGV[9])
+local probe = ARGV[10] == '1'
+
+local s = redis.call('HMGET', h, 'state', 'error_ewma', 'latency_ewma_ms', 'samples', 'consecutive_failures', 'open_count')
+local prev = s[1] or 'closed'
+local state = prev
+local e = tonumber(s[2]) or 0
+local l = tonumber(s[3]) or lat
+local n = (tonumber(s[4]) or 0) + 1
+local c = tonumber(s[5]) or 0
+local opens = tonumber(s[6]) or 0
+
+e = alpha * err + (1 - alpha) * e
+l = alpha * lat + (1 - alpha) * l
+if err == 1 then c = c + 1 else c = 0 end
+
+if probe then
+    redis.call('DEL', KEYS[2])
+    if err == 1 then
+        state = 'open'
+        opens = opens + 1
+    else
+        state = 'closed'
+        e = 0
+        c = 0
+        opens = 0
+    end
+elseif state == 'closed' and ((n >= min_samples and e >= threshold) or c >= max_consec) then
+    state = 'open'
+    opens = opens + 1
+end
+
+if state == 'open' and (prev ~= 'open' or probe) then
+    local cd = math.min(max_cd, base_cd * 2 ^ (opens - 1))
+    redis.call('HSET', h, 'open_until', now + cd, 'opened_at', now)
+end
+
+redis.call('HSET', h, 'state', state, 'error_ewma', e, 'latency_ewma_ms', l,
+    'samples', n, 'consecutive_failures', c, 'open_count', opens, 'updated_at', now)
+return state
+"""
+
+
+def endpoint_for(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _state_key(endpoint: str) -> str:
+    return f"{KEY_PREFIX}:{endpoint}"
+
+
+def _probe_key(endpoint: str) -> str:
+    return f"{KEY_PREFIX}:{endpoint}:probe"
+
+
+def _limits_key(endpoint: str) -> str:
+    # One field per worker process: each runs its own AIMD limiter
+    return f"{KEY_PREFIX}:{endpoint}:limits"
+
+
+def is_retryable_status(status_code: int) -> bool:
+    # Other 4xx mean the endpoint rejected the event; resending won't change that
+    return status_code >= 500 or status_code in (408, 425, 429)
+
+
+def is_endpoint_error(result) -> bool:
+    """
+    Errors that say the endpoint is unhealthy: the same statuses the
+    webhook worker retries. Other 4xx mean it answered.
+    """
+    if result.error:
+        return True
+    return is_retryable_status(result.status_code)
+
+
+class AdaptiveLimiter:
+    """
+    In-process AIMD concurrency limit for one host: +1/limit per fast
+    success, halved on an error, trimmed when latency exceeds the target.
+    """
+
+    def __init__(self, max_limit: int = HOST_CONCURRENCY_MAX):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= max(HOST_CONCURRENCY_MIN, int(self.limit)):
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        # Slot taken but the request never produced a result
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, error: bool, latency_ms: float):
+        with self._lock:
+            self.in_flight -= 1
+            if error:
+                self.limit = max(HOST_CONCURRENCY_MIN, self.limit * 0.5)
+            elif latency_ms > HOST_LATENCY_TARGET_MS:
+                self.limit = max(HOST_CONCURRENCY_MIN, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class Admission(NamedTuple):
+    endpoint: str
+    allowed: bool
+    probe: bool = False
+    retry_after: Optional[float] = None
+
+
+class EndpointBreakers:
+    def __init__(self, client=None, owner: str = ""):
+        self.client = client or redis_client
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._record = self.client.register_script(RECORD_SCRIPT)
+
+    def _limiter(self, endpoint: str) -> AdaptiveLimiter:
+        with self._lock:
+            limiter = self._limiters.get(endpoint)
+            if limiter is None:
+                limiter = self._limiters[endpoint] = AdaptiveLimiter()
+            return limiter
+
+    def _load(self, endpoints) -> dict:
+        endpoints = list(dict.fromkeys(endpoints))
+        pipe = self.client.pipeline(transaction=False)
+        for endpoint in endpoints:
+            pipe.hgetall(_state_key(endpoint))
+        return dict(zip(endpoints, pipe.execute()))
+
+    def admit(self, urls: list) -> list:
+        """
+        Decide for each URL whether to send now, send as the half-open
+        probe, or defer (open circuit / host at its concurrency limit).
+        """
+        endpoints = [endpoint_for(url) for url in urls]
+        states = self._load(endpoints)
+        now = time.time()
+        decisions = []
+        try:
+            self._admit_each(endpoints, states, now, decisions)
+        except Exception:
+            self.release(decisions)
+            raise
+        return decisions
+
+    def _admit_each(self, endpoints: list, states: dict, now: float, decisions: list):
+        for endpoint in endpoints:
+            state = states.get(endpoint) or {}
+            current = state.get("state", CLOSED)
+
+            if current in (OPEN, HALF_OPEN):
+                open_until = float(state.get("open_until", 0))
+                if current == OPEN and now < open_until:
+                    decisions.append(Admission(endpoint, False, retry_after=open_until - now))
+                    continue
+                # Cooldown over: exactly one request across all replicas probes
+                if self.client.set(_probe_key(endpoint), self.owner, nx=True, ex=BREAKER_PROBE_TIMEOUT_SEC):
+                    self.client.hset(_state_key(endpoint), "state", HALF_OPEN)
+                    states[endpoint] = dict(state, state=HALF_OPEN)
+                    decisions.append(Admission(endpoint, True, probe=True))
+                else:
+                    decisions.append(Admission(endpoint, False, retry_after=BREAKER_HALF_OPEN_RETRY_SEC))
+                continue
+
+            if not self._limiter(endpoint).try_acquire():
+                decisions.append(Admission(endpoint, False, retry_after=HOST_SHED_RETRY_SEC))
+                continue
+            decisions.append(Admission(endpoint, True))
+
+    def release(self, admissions: list):
+        """
+        Hand back what admit() took for requests that will never reach
+        record(): host concurrency slots and half-open probe locks.
+        """
+        for admission in admissions:
+            if not admission.allowed:
+                continue
+            if admission.probe:
+                self.client.delete(_probe_key(admission.endpoint))
+            else:
+                self._limiter(admission.endpoint).cancel()
+
+    def record(self, outcomes: list):
+        """
+        outcomes: (Admission, DeliveryResult) pairs for requests that were sent.
+        """
+        if not outcomes:
+            return
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        for admission, result in outcomes:
+            error = is_endpoint_error(result)
+            latency_ms = result.elapsed * 1000
+            self._record(
+                keys=[_state_key(admission.endpoint), _probe_key(admission.endpoint)],
+                args=[
+                    1 if error else 0, latency_ms, now,
+                    BREAKER_EWMA_ALPHA, BREAKER_ERROR_THRESHOLD, BREAKER_MIN_SAMPLES,
+                    BREAKER_MAX_CONSECUTIVE_FAILURES, BREAKER_COOLDOWN_SEC, BREAKER_MAX_COOLDOWN_SEC,
+                    1 if admission.probe else 0,
+                ],
+                client=pipe,
+            )
+            if not admission.probe:
+                limiter = self._limiter(admission.endpoint)
+                limiter.release(error, latency_ms)
+                pipe.hset(_limits_key(admission.endpoint), self.owner, f"{round(limiter.limit, 2)}:{int(now)}")
+                pipe.expire(_limits_key(admission.endpoint), HOST_LIMIT_REPORT_TTL_SEC)
+        pipe.execute()
+
+
+def _live_limits(limits: dict, now: float) -> dict:
+    live = {}
+    for owner, value in limits.items():
+        limit, _, updated_at = value.partition(":")
+        if now - float(updated_at or 0) <= HOST_LIMIT_REPORT_TTL_SEC:
+            live[owner] = float(limit)
+    return live
+
+
+def get_endpoint_health(urls: list, client=None) -> list:
+    client = client or redis_client
+    endpoints = list(dict.fromkeys(endpoint_for(url) for url in urls))
+    pipe = client.pipeline(transaction=False)
+    for endpoint in endpoints:
+        pipe.hgetall(_state_key(endpoint))
+        pipe.hgetall(_limits_key(endpoint))
+    replies = pipe.execute()
+
+    now = time.time()
+    health = []
+    for endpoint, state, limits in zip(endpoints, replies[::2], replies[1::2]):
+        open_until = float(state.get("open_until", 0) or 0)
+        current = state.get("state", CLOSED)
+        health.append({
+            "endpoint": endpoint,
+            "state": current,
+            "shedding": current != CLOSED,
+            "error_rate_ewma": round(float(state.get("error_ewma", 0)), 4),
+            "latency_ewma_ms": round(float(state.get("latency_ewma_ms", 0)), 1),
+            "consecutive_failures": int(state.get("consecutive_failures", 0)),
+            "concurrency_limits": _live_limits(limits, now),
+            "retry_in_sec": round(max(0.0, open_until - now), 1) if current == OPEN else None,
+        })
+    return health
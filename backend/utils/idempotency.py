@@ -1,14 +1,79 @@
+import os
 import hashlib
 import json
+import time
+import asyncio
+import threading
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, InterfaceError
+from sqlalchemy.dialects.postgresql import insert
 from models import IdempotencyKey
 import uuid
+import redis
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 
 IDEMPOTENCY_TTL_HOURS = 24
 
+# -----------------------------
+# Redis fast path config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+# An in-flight lock outlives a crashed request by at most this long
+IDEMPOTENCY_LOCK_TTL_SEC = float(os.getenv("IDEMPOTENCY_LOCK_TTL_SEC", "30"))
+# How long a concurrent duplicate waits for the first response before a 409
+IDEMPOTENCY_WAIT_SEC = float(os.getenv("IDEMPOTENCY_WAIT_SEC", "5"))
+IDEMPOTENCY_POLL_SEC = 0.05
+# Check Postgres for a key Redis has never seen, but only until Redis has
+# held every key for a full TTL (see IDEMPOTENCY_WARM_KEY); "false" never does
+IDEMPOTENCY_DB_FALLBACK = os.getenv("IDEMPOTENCY_DB_FALLBACK", "true").lower() == "true"
+# When this Redis started collecting keys. Gone after a flush, so the
+# fallback comes back on by itself for the next IDEMPOTENCY_TTL_HOURS.
+IDEMPOTENCY_WARM_KEY = "idem:warm_since"
+IDEMPOTENCY_PERSIST_QUEUE = os.getenv("IDEMPOTENCY_PERSIST_QUEUE", "idempotency_persist")
+# Batches being written to Postgres; entries leave only after the commit
+IDEMPOTENCY_PERSIST_PROCESSING = f"{IDEMPOTENCY_PERSIST_QUEUE}:processing"
+# Records that can't be parsed or inserted, kept for inspection
+IDEMPOTENCY_PERSIST_DLQ = f"{IDEMPOTENCY_PERSIST_QUEUE}_dlq"
+IDEMPOTENCY_PERSIST_BATCH = int(os.getenv("IDEMPOTENCY_PERSIST_BATCH", "200"))
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+# Entry values:
+#   "P:<token>:<request_hash>"          request in flight
+#   "D:<request_hash>:<response json>"  response stored
+# A successful claim returns "C:1" while Redis may be missing keys that
+# only Postgres has (younger than one TTL), otherwise "C:0".
+CLAIM_SCRIPT = """
+local v = redis.call('GET', KEYS[1])
+if v then return v end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[3], 'NX')
+if tonumber(ARGV[3]) - tonumber(redis.call('GET', KEYS[2])) < tonumber(ARGV[4]) then
+    return 'C:1'
+end
+return 'C:0'
+"""
+
+# Store the response and queue the durable copy atomically, but only while
+# we still hold the lock (or nobody does, if it expired mid-request).
+COMPLETE_SCRIPT = """
+local v = redis.call('GET', KEYS[1])
+if v and v ~= ARGV[1] then return 0 end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('RPUSH', KEYS[2], ARGV[4])
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 def hash_request(payload: dict) -> str:
     raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
@@ -21,8 +86,6 @@ def get_existing_response(
     idem_key: str,
     request_payload: dict,
 ):
-    request_hash = hash_request(request_payload)
-
     record = (
         db.query(IdempotencyKey)
         .filter(
@@ -33,11 +96,32 @@ def get_existing_response(
         .first()
     )
 
+    return _stored_response(record, request_payload)
+
+
+async def get_existing_response_async(
+    db,
+    merchant_id: str | None,
+    idem_key: str,
+    request_payload: dict,
+):
+    result = await db.execute(
+        select(IdempotencyKey).where(
+            IdempotencyKey.merchant_id == merchant_id,
+            IdempotencyKey.key == idem_key,
+            IdempotencyKey.expires_at > datetime.utcnow(),
+        )
+    )
+
+    return _stored_response(result.scalars().first(), request_payload)
+
+
+def _stored_response(record, request_payload: dict):
     if not record:
         return None
 
     # 🚨 SAME KEY + DIFFERENT PAYLOAD = HARD FAIL
-    if record.request_hash != request_hash:
+    if record.request_hash != hash_request(request_payload):
         raise HTTPException(
             status_code=409,
             detail="Idempotency key reused with different request payload",
@@ -46,25 +130,344 @@ def get_existing_response(
     return record.response
 
 
-def save_idempotency_response(
-    db: Session,
-    merchant_id: str | None,
-    idem_key: str,
-    request_payload: dict,
-    response_body: dict,
-    response_code: int,
-):
-    record = IdempotencyKey(
-        id=str(uuid.uuid4()),
-        merchant_id=merchant_id,
-        key=idem_key,
-        request_hash=hash_request(request_payload),
-        response={
-            "body": response_body,
-            "status_code": response_code
-        },
-        expires_at=datetime.utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+# -----------------------------
+# Redis fast path
+# -----------------------------
+def _redis_key(merchant_id: str | None, idem_key: str) -> str:
+    return f"idem:{merchant_id}:{idem_key}"
+
+
+def _mismatch():
+    return HTTPException(
+        status_code=409,
+        detail="Idempotency key reused with different request payload",
+    )
+
+
+def _in_progress():
+    return HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still in progress",
     )
 
-    db.add(record)
-    db.commit()
\ No newline at end of file
+
+def _done_value(request_hash: str, response: dict) -> str:
+    return f"D:{request_hash}:{json.dumps(response, separators=(',', ':'), default=str)}"
+
+
+def _parse_entry(value: str, request_hash: str):
+    """
+    Returns ("done", response) or ("pending", None); 409 on a payload mismatch.
+    """
+    state, rest = value[0], value[2:]
+    if state == "D":
+        stored_hash, body = rest.split(":", 1)
+        if stored_hash != request_hash:
+            raise _mismatch()
+        return "done", json.loads(body)
+    _, stored_hash = rest.split(":", 1)
+    if stored_hash != request_hash:
+        raise _mismatch()
+    return "pending", None
+
+
+class IdempotentRequest:
+    """
+    One request's view of its Idempotency-Key.
+
+    begin() checks the key and takes the in-flight lock in one atomic
+    round trip. `cached` is the stored response if the key was already
+    completed (or a concurrent duplicate finished while we waited).
+    Call save() with the response; leaving without saving (an exception,
+    a 4xx) releases the lock so the client can retry.
+    """
+
+    def __init__(self, merchant_id: str | None, idem_key: str | None, request_payload: dict, client=None):
+        self.merchant_id = merchant_id
+        self.idem_key = idem_key
+        self.request_payload = request_payload
+        self.request_hash = hash_request(request_payload)
+        self.client = client or redis_client
+        self.redis_key = _redis_key(merchant_id, idem_key)
+        self.lock_value = f"P:{uuid.uuid4().hex}:{self.request_hash}"
+        self.cached = None
+        self.owned = False
+
+    # -- helpers shared by the sync and async paths --
+    def _claim_args(self):
+        return dict(
+            keys=[self.redis_key, IDEMPOTENCY_WARM_KEY],
+            args=[self.lock_value, int(IDEMPOTENCY_LOCK_TTL_SEC * 1000), int(time.time()), IDEMPOTENCY_TTL_HOURS * 3600],
+        )
+
+    def _complete_args(self, response_body: dict, response_code: int):
+        response = {"body": response_body, "status_code": response_code}
+        record = {
+            "merchant_id": self.merchant_id,
+            "key": self.idem_key,
+            "request_hash": self.request_hash,
+            "response": response,
+            "expires_at": (datetime.utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS)).isoformat(),
+        }
+        return dict(
+            keys=[self.redis_key, IDEMPOTENCY_PERSIST_QUEUE],
+            args=[
+                self.lock_value,
+                _done_value(self.request_hash, response),
+                IDEMPOTENCY_TTL_HOURS * 3600,
+                json.dumps(record, default=str),
+            ],
+        )
+
+    def response(self) -> JSONResponse:
+        return JSONResponse(content=self.cached["body"], status_code=self.cached["status_code"])
+
+    # -- sync --
+    def begin(self, db: Session | None = None):
+        if not self.idem_key:
+            return self
+        claim = self.client.register_script(CLAIM_SCRIPT)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SEC
+
+        while True:
+            existing = claim(**self._claim_args())
+            if existing.startswith("C:"):
+                break
+            state, response = _parse_entry(existing, self.request_hash)
+            if state == "done":
+                self.cached = response
+                return self
+            # Concurrent duplicate: wait for the first request to finish
+            if time.monotonic() >= deadline:
+                raise _in_progress()
+            time.sleep(IDEMPOTENCY_POLL_SEC)
+
+        self.owned = True
+        if db is not None and IDEMPOTENCY_DB_FALLBACK and existing == "C:1":
+            try:
+                stored = get_existing_response(db, self.merchant_id, self.idem_key, self.request_payload)
+            except Exception:
+                self.release()
+                raise
+            if stored:
+                self.cached = stored
+                self.client.set(self.redis_key, _done_value(self.request_hash, stored), ex=IDEMPOTENCY_TTL_HOURS * 3600)
+                self.owned = False
+        return self
+
+    def save(self, response_body: dict, response_code: int):
+        if not self.owned:
+            return
+        complete = self.client.register_script(COMPLETE_SCRIPT)
+        complete(**self._complete_args(response_body, response_code))
+        self.owned = False
+
+    def release(self):
+        if self.owned:
+            self.client.register_script(RELEASE_SCRIPT)(keys=[self.redis_key], args=[self.lock_value])
+            self.owned = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    # -- async --
+    async def begin_async(self, aclient, db=None):
+        if not self.idem_key:
+            return self
+        claim = aclient.register_script(CLAIM_SCRIPT)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SEC
+
+        while True:
+            existing = await claim(**self._claim_args())
+            if existing.startswith("C:"):
+                break
+            state, response = _parse_entry(existing, self.request_hash)
+            if state == "done":
+                self.cached = response
+                return self
+            if time.monotonic() >= deadline:
+                raise _in_progress()
+            await asyncio.sleep(IDEMPOTENCY_POLL_SEC)
+
+        self.owned = True
+        self._aclient = aclient
+        if db is not None and IDEMPOTENCY_DB_FALLBACK and existing == "C:1":
+            try:
+                stored = await get_existing_response_async(db, self.merchant_id, self.idem_key, self.request_payload)
+            except Exception:
+                await self.release_async()
+                raise
+            if stored:
+                self.cached = stored
+                await aclient.set(self.redis_key, _done_value(self.request_hash, stored), ex=IDEMPOTENCY_TTL_HOURS * 3600)
+                self.owned = False
+        return self
+
+    async def save_async(self, response_body: dict, response_code: int):
+        if not self.owned:
+            return
+        complete = self._aclient.register_script(COMPLETE_SCRIPT)
+        await complete(**self._complete_args(response_body, response_code))
+        self.owned = False
+
+    async def release_async(self):
+        if self.owned:
+            await self._aclient.register_script(RELEASE_SCRIPT)(keys=[self.redis_key], args=[self.lock_value])
+            self.owned = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release_async()
+        return False
+
+
+# -----------------------------
+# Durable copy (Redis → Postgres)
+# -----------------------------
+def _take_batch(client, batch: int) -> list:
+    # LMOVE keeps each record in the processing list until it is committed
+    count = min(batch, client.llen(IDEMPOTENCY_PERSIST_QUEUE))
+    if count <= 0:
+        return []
+    pipe = client.pipeline(transaction=False)
+    for _ in range(count):
+        pipe.lmove(IDEMPOTENCY_PERSIST_QUEUE, IDEMPOTENCY_PERSIST_PROCESSING, "LEFT", "RIGHT")
+    return [item for item in pipe.execute() if item is not None]
+
+
+def _finish_batch(client, items: list, requeue: bool = False):
+    pipe = client.pipeline(transaction=True)
+    for item in items:
+        pipe.lrem(IDEMPOTENCY_PERSIST_PROCESSING, 1, item)
+    if requeue:
+        pipe.lpush(IDEMPOTENCY_PERSIST_QUEUE, *reversed(items))
+    pipe.execute()
+
+
+def requeue_unfinished(client=None) -> int:
+    """
+    Put back batches a crashed writer had taken but not committed. Also
+    moves batches other writers are still on; writing a record twice is
+    harmless (ON CONFLICT DO NOTHING).
+    """
+    client = client or redis_client
+    moved = 0
+    while client.lmove(IDEMPOTENCY_PERSIST_PROCESSING, IDEMPOTENCY_PERSIST_QUEUE, "RIGHT", "LEFT") is not None:
+        moved += 1
+    return moved
+
+
+def _record_row(item: str) -> dict:
+    record = json.loads(item)
+    return {
+        "id": str(uuid.uuid4()),
+        "merchant_id": record["merchant_id"],
+        "key": record["key"],
+        "request_hash": record["request_hash"],
+        "response": record["response"],
+        "expires_at": datetime.fromisoformat(record["expires_at"]),
+    }
+
+
+def _insert_rows(db: Session, rows: list):
+    db.execute(
+        insert(IdempotencyKey).values(rows).on_conflict_do_nothing(constraint="uq_merchant_idem_key")
+    )
+    db.commit()
+
+
+def _dead_letter(client, items: list, reason):
+    print(f"⚠️ Moving {len(items)} idempotency record(s) to {IDEMPOTENCY_PERSIST_DLQ}: {reason}")
+    pipe = client.pipeline(transaction=True)
+    for item in items:
+        pipe.lrem(IDEMPOTENCY_PERSIST_PROCESSING, 1, item)
+    pipe.rpush(IDEMPOTENCY_PERSIST_DLQ, *items)
+    pipe.execute()
+
+
+def _persist_one_by_one(db: Session, client, parsed: list):
+    """
+    The batch insert failed on some row: find it, dead-letter it, keep
+    the rest. A connection error still puts the remainder back.
+    """
+    for index, (item, row) in enumerate(parsed):
+        try:
+            _insert_rows(db, [row])
+        except (OperationalError, InterfaceError):
+            db.rollback()
+            _finish_batch(client, [item for item, _ in parsed[index:]], requeue=True)
+            raise
+        except Exception as e:
+            db.rollback()
+            _dead_letter(client, [item], e)
+            continue
+        _finish_batch(client, [item])
+
+
+def persist_pending(db: Session, client=None, batch: int = IDEMPOTENCY_PERSIST_BATCH) -> int:
+    """
+    Write one batch of completed responses to idempotency_keys and return
+    how many records were taken off the queue. Rows that already exist
+    (DB fallback, replays) are left alone; records that can't be parsed
+    or inserted go to IDEMPOTENCY_PERSIST_DLQ instead of blocking the queue.
+    """
+    client = client or redis_client
+    items = _take_batch(client, batch)
+    if not items:
+        return 0
+
+    parsed = []
+    for item in items:
+        try:
+            parsed.append((item, _record_row(item)))
+        except (ValueError, KeyError, TypeError) as e:
+            _dead_letter(client, [item], f"malformed record: {e}")
+    if not parsed:
+        return len(items)
+
+    try:
+        _insert_rows(db, [row for _, row in parsed])
+    except (OperationalError, InterfaceError):
+        db.rollback()
+        # Database unreachable: put the batch back so the next pass retries it
+        _finish_batch(client, [item for item, _ in parsed], requeue=True)
+        raise
+    except Exception:
+        db.rollback()
+        _persist_one_by_one(db, client, parsed)
+        return len(items)
+    _finish_batch(client, [item for item, _ in parsed])
+    return len(items)
+
+
+def _persist_loop():
+    from database import SessionLocal
+    while True:
+        try:
+            requeue_unfinished()
+            break
+        except Exception as e:
+            print(f"⚠️ Idempotency persist recovery error: {e}")
+            time.sleep(1)
+    while True:
+        db = SessionLocal()
+        try:
+            while persist_pending(db) >= IDEMPOTENCY_PERSIST_BATCH:
+                pass
+        except Exception as e:
+            print(f"⚠️ Idempotency persist error: {e}")
+        finally:
+            db.close()
+        time.sleep(0.5)
+
+
+def start_persist_writer():
+    thread = threading.Thread(target=_persist_loop, name="idempotency-persist", daemon=True)
+    thread.start()
+    return thread
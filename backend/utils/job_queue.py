@@ -0,0 +1,287 @@
+import os
+import socket
+import time
+from typing import NamedTuple, Optional
+
+import redis
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+# "list"   → RPUSH / BLPOP (original behaviour, at-most-once)
+# "stream" → Redis Streams consumer groups (at-least-once, explicit ack)
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "list").lower()
+
+STREAM_GROUP = os.getenv("STREAM_GROUP", "gateway_workers")
+STREAM_CONSUMER = os.getenv("STREAM_CONSUMER", f"{socket.gethostname()}-{os.getpid()}")
+# Pending entries idle longer than this belong to a dead consumer and are reclaimed
+STREAM_CLAIM_IDLE_MS = int(os.getenv("STREAM_CLAIM_IDLE_MS", "60000"))
+STREAM_RECLAIM_INTERVAL_SEC = float(os.getenv("STREAM_RECLAIM_INTERVAL_SEC", "15"))
+STREAM_MAX_DELIVERIES = int(os.getenv("STREAM_MAX_DELIVERIES", "5"))
+# How often a consumer trims acked entries and prunes idle consumers
+STREAM_MAINTENANCE_INTERVAL_SEC = float(os.getenv("STREAM_MAINTENANCE_INTERVAL_SEC", "30"))
+# Consumers with nothing pending and idle this long are removed from the group
+STREAM_CONSUMER_IDLE_MS = int(os.getenv("STREAM_CONSUMER_IDLE_MS", "3600000"))
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+class Job(NamedTuple):
+    id: Optional[str]
+    payload: str
+
+
+def _stream_id(entry_id: str) -> tuple:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+# -----------------------------
+# List backend
+# -----------------------------
+class ListQueue:
+    backend = "list"
+
+    def __init__(self, name: str, client=None):
+        self.name = name
+        self.client = client or redis_client
+
+    def enqueue(self, payload: str):
+        self.client.rpush(self.name, payload)
+
+    def enqueue_many(self, payloads: list):
+        if payloads:
+            self.client.rpush(self.name, *payloads)
+
+    async def enqueue_async(self, aclient, payload: str):
+        await aclient.rpush(self.name, payload)
+
+    def dequeue(self, timeout: int = 5) -> Optional[Job]:
+        item = self.client.blpop(self.name, timeout=timeout)
+        if not item:
+            return None
+        return Job(id=None, payload=item[1])
+
+    def dequeue_batch(self, max_items: int, timeout: int = 5) -> list:
+        """
+        Block for the first job, then take up to max_items - 1 more that
+        are already waiting (LPOP with count, Redis >= 6.2).
+        """
+        first = self.dequeue(timeout=timeout)
+        if not first or max_items <= 1:
+            return [first] if first else []
+        rest = self.client.lpop(self.name, max_items - 1) or []
+        return [first] + [Job(id=None, payload=payload) for payload in rest]
+
+    def ack(self, job: Job):
+        # BLPOP already removed the job
+        pass
+
+    def depth(self) -> int:
+        return self.client.llen(self.name)
+
+    def stats(self) -> dict:
+        return {"backend": "list", "depth": self.depth()}
+
+
+# -----------------------------
+# Streams backend
+# -----------------------------
+class StreamQueue:
+    backend = "stream"
+
+    def __init__(
+        self,
+        name: str,
+        client=None,
+        group: str = STREAM_GROUP,
+        consumer: str = STREAM_CONSUMER,
+        dlq: Optional[str] = None,
+    ):
+        self.name = name
+        self.client = client or redis_client
+        self.group = group
+        self.consumer = consumer
+        self.dlq = dlq
+        self._group_ready = False
+        self._next_reclaim = 0.0
+        self._reclaim_cursor = "0-0"
+        self._next_maintenance = 0.0
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.name, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def enqueue(self, payload: str):
+        self.client.xadd(self.name, {"data": payload})
+
+    def enqueue_many(self, payloads: list):
+        pipe = self.client.pipeline(transaction=False)
+        for payload in payloads:
+            pipe.xadd(self.name, {"data": payload})
+        pipe.execute()
+
+    async def enqueue_async(self, aclient, payload: str):
+        await aclient.xadd(self.name, {"data": payload})
+
+    def dequeue(self, timeout: int = 5) -> Optional[Job]:
+        self._ensure_group()
+
+        self._maintain()
+
+        if time.monotonic() >= self._next_reclaim:
+            job = self._reclaim()
+            if job:
+                return job
+
+        resp = self.client.xreadgroup(
+            self.group, self.consumer, {self.name: ">"}, count=1, block=timeout * 1000
+        )
+        if not resp:
+            return None
+        _, entries = resp[0]
+        entry_id, fields = entries[0]
+        return Job(id=entry_id, payload=fields.get("data"))
+
+    def dequeue_batch(self, max_items: int, timeout: int = 5) -> list:
+        """
+        Up to max_items new entries in one XREADGROUP. A reclaimed entry
+        is returned on its own.
+        """
+        self._ensure_group()
+
+        self._maintain()
+
+        if time.monotonic() >= self._next_reclaim:
+            job = self._reclaim()
+            if job:
+                return [job]
+
+        resp = self.client.xreadgroup(
+            self.group, self.consumer, {self.name: ">"}, count=max_items, block=timeout * 1000
+        )
+        if not resp:
+            return []
+        _, entries = resp[0]
+        return [Job(id=entry_id, payload=fields.get("data")) for entry_id, fields in entries]
+
+    def _reclaim(self) -> Optional[Job]:
+        """
+        Take over one entry whose consumer died before acking it.
+        Entries redelivered too many times are parked in the DLQ.
+        """
+        cursor, claimed = self.client.xautoclaim(
+            self.name, self.group, self.consumer,
+            min_idle_time=STREAM_CLAIM_IDLE_MS,
+            start_id=self._reclaim_cursor,
+            count=1,
+        )[:2]
+        self._reclaim_cursor = cursor
+        if cursor == "0-0":
+            self._next_reclaim = time.monotonic() + STREAM_RECLAIM_INTERVAL_SEC
+
+        for entry_id, fields in claimed:
+            # Entry was trimmed/deleted while pending
+            if fields is None:
+                self.client.xack(self.name, self.group, entry_id)
+                continue
+
+            job = Job(id=entry_id, payload=fields.get("data"))
+            pending = self.client.xpending_range(
+                self.name, self.group, min=entry_id, max=entry_id, count=1
+            )
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            if self.dlq and deliveries > STREAM_MAX_DELIVERIES:
+                print(f"⚠️ {self.name} entry {entry_id} delivered {deliveries}x, moving to DLQ")
+                self.client.rpush(self.dlq, job.payload)
+                self.ack(job)
+                continue
+
+            print(f"♻️ Reclaimed {self.name} entry {entry_id} (delivery {deliveries})")
+            return job
+        return None
+
+    def ack(self, job: Job):
+        # No XDEL here: deleted entries make XINFO GROUPS report lag as
+        # NULL. Acked entries are trimmed in bulk by _maintain().
+        self.client.xack(self.name, self.group, job.id)
+
+    def _maintain(self):
+        if time.monotonic() < self._next_maintenance:
+            return
+        self._next_maintenance = time.monotonic() + STREAM_MAINTENANCE_INTERVAL_SEC
+        try:
+            self._trim_acked()
+            self._prune_consumers()
+        except redis.RedisError as e:
+            print(f"⚠️ {self.name} stream maintenance failed: {e}")
+
+    def _trim_acked(self):
+        """
+        XTRIM MINID up to the oldest entry some group still needs: its
+        oldest pending entry, or else the first one it has not read yet.
+        """
+        minid = None
+        for group in self.client.xinfo_groups(self.name):
+            pending = self.client.xpending(self.name, group["name"])
+            if pending["pending"]:
+                needed = pending["min"]
+            else:
+                ms, seq = _stream_id(group["last-delivered-id"])
+                needed = f"{ms}-{seq + 1}"
+            if minid is None or _stream_id(needed) < _stream_id(minid):
+                minid = needed
+        if minid is not None:
+            # Approximate trimming only drops whole radix tree nodes (cheap)
+            self.client.xtrim(self.name, minid=minid, approximate=True)
+
+    def _prune_consumers(self):
+        # Consumers of replicas that are gone; safe to drop with nothing pending
+        for consumer in self.client.xinfo_consumers(self.name, self.group):
+            if (
+                consumer["name"] != self.consumer
+                and consumer["pending"] == 0
+                and consumer["idle"] >= STREAM_CONSUMER_IDLE_MS
+            ):
+                self.client.xgroup_delconsumer(self.name, self.group, consumer["name"])
+
+    def depth(self) -> int:
+        return self.client.xlen(self.name)
+
+    def stats(self) -> dict:
+        self._ensure_group()
+        group = next(
+            (g for g in self.client.xinfo_groups(self.name) if g["name"] == self.group),
+            {},
+        )
+        consumers = [
+            {
+                "name": c["name"],
+                "pending": c["pending"],
+                "idle_ms": c["idle"],
+            }
+            for c in self.client.xinfo_consumers(self.name, self.group)
+        ]
+        return {
+            "backend": "stream",
+            "depth": self.depth(),
+            "group": self.group,
+            # entries not yet delivered to any consumer (Redis >= 7)
+            "lag": group.get("lag"),
+            "pending": group.get("pending", 0),
+            "consumers": consumers,
+        }
+
+
+def get_queue(name: str, dlq: Optional[str] = None, client=None):
+    if QUEUE_BACKEND == "stream":
+        return StreamQueue(name, client=client, dlq=dlq)
+    return ListQueue(name, client=client)
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.postgresql import insert
+
+from models.metrics import MerchantMetricMinute, LATENCY_BUCKETS_SEC
+
+HISTOGRAM_COLUMNS = [f"latency_le_{b}s" for b in LATENCY_BUCKETS_SEC] + [f"latency_gt_{LATENCY_BUCKETS_SEC[-1]}s"]
+
+
+def minute_bucket(at: datetime | None = None) -> datetime:
+    at = at or datetime.now(timezone.utc)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.astimezone(timezone.utc).replace(second=0, microsecond=0)
+
+
+def latency_column(seconds: float) -> str:
+    for bound, column in zip(LATENCY_BUCKETS_SEC, HISTOGRAM_COLUMNS):
+        if seconds <= bound:
+            return column
+    return HISTOGRAM_COLUMNS[-1]
+
+
+def payment_outcome(success: bool, latency_sec: float | None) -> dict:
+    counts = {"payments_success" if success else "payments_failed": 1}
+    if latency_sec is not None:
+        counts["latency_sum_ms"] = int(latency_sec * 1000)
+        counts[latency_column(latency_sec)] = 1
+    return counts
+
+
+def _upsert(merchant_id: str, at: datetime | None, counts: dict):
+    counts = {column: value for column, value in counts.items() if value}
+    if not merchant_id or not counts:
+        return None
+
+    table = MerchantMetricMinute.__table__
+    stmt = insert(table).values(merchant_id=merchant_id, bucket=minute_bucket(at), **counts)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.merchant_id, table.c.bucket],
+        set_={column: table.c[column] + stmt.excluded[column] for column in counts},
+    )
+
+
+def record_metrics(db, merchant_id: str, at: datetime | None = None, **counts):
+    """
+    Add counts to the merchant's current minute row (upsert). Runs in the
+    caller's transaction so the rollup commits with the state change.
+    """
+    stmt = _upsert(merchant_id, at, counts)
+    if stmt is not None:
+        db.execute(stmt)
+
+
+async def record_metrics_async(db, merchant_id: str, at: datetime | None = None, **counts):
+    """record_metrics for an AsyncSession."""
+    stmt = _upsert(merchant_id, at, counts)
+    if stmt is not None:
+        await db.execute(stmt)
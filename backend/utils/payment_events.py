@@ -0,0 +1,121 @@
+import os
+import json
+import asyncio
+import logging
+
+CHANNEL_PREFIX = "payment_events:"
+TERMINAL_STATUSES = ("success", "failed")
+
+# SSE comment sent while waiting so proxies keep the connection open
+PAYMENT_EVENTS_HEARTBEAT_SEC = float(os.getenv("PAYMENT_EVENTS_HEARTBEAT_SEC", "15"))
+# Stream is closed after this long; the client reconnects
+PAYMENT_EVENTS_MAX_WAIT_SEC = float(os.getenv("PAYMENT_EVENTS_MAX_WAIT_SEC", "120"))
+
+
+def is_terminal(status: str | None) -> bool:
+    return (status or "").lower() in TERMINAL_STATUSES
+
+
+def payment_event(payment) -> dict:
+    from schemas import PaymentResponse
+    return PaymentResponse.from_orm(payment).model_dump(mode="json")
+
+
+def publish_payment_status(redis_client, payment):
+    """
+    Called by workers after committing a payment's status change.
+    """
+    redis_client.publish(f"{CHANNEL_PREFIX}{payment.id}", json.dumps(payment_event(payment)))
+
+
+class PaymentEventHub:
+    """
+    One pattern subscription per API process, fanned out to the SSE
+    streams waiting on each payment, so open checkout tabs cost an
+    asyncio.Queue each instead of a Redis connection or DB polling.
+    """
+
+    def __init__(self):
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+        self._task = None
+        self._ready = None
+
+    async def _run(self):
+        from utils.async_redis import redis_client
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self._ready.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    payment_id = message["channel"][len(CHANNEL_PREFIX):]
+                    for queue in list(self._listeners.get(payment_id, ())):
+                        queue.put_nowait(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Payment event hub disconnected: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def subscribe(self, payment_id: str) -> asyncio.Queue:
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            # Redis unavailable: the stream still sends the current status
+            pass
+        queue = asyncio.Queue()
+        self._listeners.setdefault(payment_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, payment_id: str, queue: asyncio.Queue):
+        queues = self._listeners.get(payment_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._listeners[payment_id]
+
+
+payment_event_hub = PaymentEventHub()
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_payment_status(payment_id: str, queue: asyncio.Queue, current: dict):
+    """
+    SSE body: the current status, then every published change until the
+    payment is final (or PAYMENT_EVENTS_MAX_WAIT_SEC passes).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + PAYMENT_EVENTS_MAX_WAIT_SEC
+    try:
+        yield sse("status", current)
+        if is_terminal(current.get("status")):
+            return
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield sse("timeout", {"id": payment_id})
+                return
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=min(PAYMENT_EVENTS_HEARTBEAT_SEC, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            event = json.loads(data)
+            yield sse("status", event)
+            if is_terminal(event.get("status")):
+                return
+    finally:
+        payment_event_hub.unsubscribe(payment_id, queue)
@@ -8,6 +8,8 @@ from sqlalchemy.orm import Session
 from models import Payment, Order
 from utils.errors import not_found, bad_request
 from utils import generate_id
+from utils.job_queue import get_queue
+from utils.read_cache import invalidate
 
 # -----------------------------
 # Config
@@ -19,6 +21,7 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "gateway_webhooks")
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+webhook_queue = get_queue(WEBHOOK_QUEUE, client=redis_client)
 
 # =====================================================
 # ✅ API-SIDE FUNCTION (required for imports)
@@ -88,6 +91,7 @@ def process_payment_job(db: Session, payment_id: str):
         order.status = "FAILED"
 
     db.commit()
+    invalidate(redis_client, payment_ids=[payment.id], order_ids=[order.id])
 
 
     # enqueue webhook AFTER final state
@@ -101,4 +105,4 @@ def process_payment_job(db: Session, payment_id: str):
         "merchant_id": payment.merchant_id,
     }
 
-    redis_client.rpush(WEBHOOK_QUEUE, json.dumps(job))
\ No newline at end of file
+    webhook_queue.enqueue(json.dumps(job))
\ No newline at end of file
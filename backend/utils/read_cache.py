@@ -0,0 +1,147 @@
+import os
+import json
+
+import redis
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+# Final records never change again
+PUBLIC_CACHE_TERMINAL_TTL_SEC = int(os.getenv("PUBLIC_CACHE_TERMINAL_TTL_SEC", "86400"))
+# Records still moving: short, so a missed invalidation heals quickly
+PUBLIC_CACHE_ACTIVE_TTL_SEC = int(os.getenv("PUBLIC_CACHE_ACTIVE_TTL_SEC", "2"))
+# Unknown ids (negative cache)
+PUBLIC_CACHE_MISSING_TTL_SEC = int(os.getenv("PUBLIC_CACHE_MISSING_TTL_SEC", "5"))
+# After a write, refills are blocked this long so a reader holding the
+# pre-write row can't put it back
+PUBLIC_CACHE_TOMBSTONE_TTL_SEC = int(os.getenv("PUBLIC_CACHE_TOMBSTONE_TTL_SEC", "5"))
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+MISSING = "__missing__"
+TOMBSTONE = "__invalidated__"
+
+
+def _key(kind: str, record_id: str) -> str:
+    return f"cache:{kind}:{record_id}"
+
+
+def payment_is_final(data: dict) -> bool:
+    # A successful payment can still be captured, which changes the record
+    status = (data.get("status") or "").lower()
+    return status == "failed" or (status == "success" and data.get("captured"))
+
+
+def order_is_final(data: dict) -> bool:
+    return (data.get("status") or "").lower() == "paid"
+
+
+FINAL = {"payment": payment_is_final, "order": order_is_final}
+
+
+def _ttl(kind: str, data: dict | None) -> int:
+    if data is None:
+        return PUBLIC_CACHE_MISSING_TTL_SEC
+    if FINAL[kind](data):
+        return PUBLIC_CACHE_TERMINAL_TTL_SEC
+    return PUBLIC_CACHE_ACTIVE_TTL_SEC
+
+
+def _decode(raw: str):
+    """
+    Returns (hit, data). A negative-cache hit is (True, None).
+    """
+    if raw is None or raw == TOMBSTONE:
+        return False, None
+    if raw == MISSING:
+        return True, None
+    return True, json.loads(raw)
+
+
+def _encode(data: dict | None) -> str:
+    return MISSING if data is None else json.dumps(data)
+
+
+def get_or_load(kind: str, record_id: str, loader, client=None, cache_missing: bool = True):
+    """
+    Read-through: cached dict (or None for a known-missing id), otherwise
+    loader() → dict | None, stored with a TTL that depends on its state.
+    Pass cache_missing=False when the loader read a replica: a miss there
+    may only mean the row has not replicated yet.
+    """
+    client = client or redis_client
+    key = _key(kind, record_id)
+    try:
+        hit, data = _decode(client.get(key))
+        if hit:
+            return data
+    except redis.RedisError:
+        return loader()
+
+    data = loader()
+    if data is None and not cache_missing:
+        return None
+    try:
+        # NX: never overwrite a tombstone left by a concurrent write
+        client.set(key, _encode(data), ex=_ttl(kind, data), nx=True)
+    except redis.RedisError:
+        pass
+    return data
+
+
+async def get_or_load_async(kind: str, record_id: str, loader, aclient, cache_missing: bool = True):
+    """
+    get_or_load for the async routers; loader is a coroutine function.
+    """
+    key = _key(kind, record_id)
+    try:
+        hit, data = _decode(await aclient.get(key))
+        if hit:
+            return data
+    except redis.RedisError:
+        return await loader()
+
+    data = await loader()
+    if data is None and not cache_missing:
+        return None
+    try:
+        await aclient.set(key, _encode(data), ex=_ttl(kind, data), nx=True)
+    except redis.RedisError:
+        pass
+    return data
+
+
+def prime(kind: str, record_id: str, data: dict, client=None):
+    """
+    Called right after creating a record (before handing it to a worker),
+    so the first reads neither hit a lagging replica nor find a stale
+    negative-cache entry.
+    """
+    client = client or redis_client
+    try:
+        client.set(_key(kind, record_id), _encode(data), ex=_ttl(kind, data))
+    except redis.RedisError:
+        pass
+
+
+async def prime_async(kind: str, record_id: str, data: dict, aclient):
+    try:
+        await aclient.set(_key(kind, record_id), _encode(data), ex=_ttl(kind, data))
+    except redis.RedisError:
+        pass
+
+
+def invalidate(client=None, payment_ids=(), order_ids=()):
+    """
+    Called by writers after they commit a state change.
+    """
+    client = client or redis_client
+    keys = [_key("payment", i) for i in payment_ids if i] + [_key("order", i) for i in order_ids if i]
+    if not keys:
+        return
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.set(key, TOMBSTONE, ex=PUBLIC_CACHE_TOMBSTONE_TTL_SEC)
+    pipe.execute()
@@ -0,0 +1,59 @@
+import os
+
+import redis
+
+from database import read_router, DATABASE_REPLICA_URL
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+# After a write, the merchant's reads stay on the primary this long
+READ_YOUR_WRITES_SEC = int(os.getenv("READ_YOUR_WRITES_SEC", "5"))
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def _key(merchant_id: str) -> str:
+    return f"ryw:{merchant_id}"
+
+
+def mark_write(merchant_id: str):
+    """
+    Called by write endpoints so a GET that follows the POST is not served
+    from a replica that hasn't replayed it yet. No-op without a replica.
+    """
+    if read_router.replica_engine is None or not merchant_id:
+        return
+    try:
+        redis_client.set(_key(merchant_id), 1, ex=READ_YOUR_WRITES_SEC)
+    except redis.RedisError:
+        pass
+
+
+async def mark_write_async(aclient, merchant_id: str):
+    if read_router.replica_engine is None or not merchant_id:
+        return
+    try:
+        await aclient.set(_key(merchant_id), 1, ex=READ_YOUR_WRITES_SEC)
+    except redis.RedisError:
+        pass
+
+
+def wrote_recently(merchant_id: str) -> bool:
+    if read_router.replica_engine is None or not merchant_id:
+        return False
+    try:
+        return bool(redis_client.exists(_key(merchant_id)))
+    except redis.RedisError:
+        # Can't tell: stay consistent
+        return True
+
+
+async def wrote_recently_async(aclient, merchant_id: str) -> bool:
+    if not DATABASE_REPLICA_URL or not merchant_id:
+        return False
+    try:
+        return bool(await aclient.exists(_key(merchant_id)))
+    except redis.RedisError:
+        return True
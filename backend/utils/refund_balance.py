@@ -0,0 +1,32 @@
+from sqlalchemy import update, select, literal
+
+from models import Payment
+
+
+def reserve_refund(payment_id: str, merchant_id: str, amount: int):
+    """
+    Atomically add `amount` to the payment's refunded_amount if it still
+    fits. The row lock taken by the UPDATE serialises concurrent refunds,
+    and the WHERE is re-checked after the lock, so two requests can never
+    both pass. A non-positive amount never matches, so it cannot lower the
+    balance. Returns the payment id, or nothing when it was not applied.
+    """
+    return (
+        update(Payment)
+        .where(
+            Payment.id == payment_id,
+            Payment.merchant_id == merchant_id,
+            literal(amount) > 0,
+            Payment.amount - Payment.refunded_amount >= amount,
+        )
+        .values(refunded_amount=Payment.refunded_amount + amount)
+        .returning(Payment.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def payment_exists(payment_id: str, merchant_id: str):
+    """
+    Only run when reserve_refund matched nothing, to tell 404 from 400.
+    """
+    return select(Payment.id).where(Payment.id == payment_id, Payment.merchant_id == merchant_id)
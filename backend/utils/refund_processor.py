@@ -3,11 +3,14 @@ import random
 import os
 import json
 import redis
+from collections import defaultdict
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from datetime import datetime
 
 from models import Refund, Payment, Order
+from utils.job_queue import get_queue
+from utils.retry import TerminalError
+from utils.metrics import record_metrics
 
 # -----------------------------
 # Config
@@ -20,43 +23,21 @@ REFUND_QUEUE = os.getenv("REFUND_QUEUE", "gateway_refunds")
 WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "gateway_webhooks")
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+webhook_queue = get_queue(WEBHOOK_QUEUE, client=redis_client)
 
-# =====================================================
-# Worker: process refund
-# =====================================================
-def process_refund_job(db: Session, refund_id: str):
-    refund = db.query(Refund).filter(Refund.id == refund_id).first()
-    if not refund:
-        raise ValueError(f"Refund {refund_id} not found")
-
-    payment = db.query(Payment).filter(Payment.id == refund.payment_id).first()
-    if not payment:
-        raise ValueError("Payment not found")
-
-    order = db.query(Order).filter(Order.id == payment.order_id).first()
-    if not order:
-        raise ValueError("Order not found")
 
-    # -----------------------------
-    # Simulate async delay
-    # -----------------------------
+def settle_with_gateway(refund_id: str):
+    """
+    Simulated gateway round trip. Pure I/O wait, so a batch runs these
+    in parallel.
+    """
     if DEFAULT_TEST_MODE:
         time.sleep(TEST_PROCESSING_DELAY_MS / 1000)
     else:
         time.sleep(random.uniform(3, 5))
 
-    # -----------------------------
-    # Outcome
-    # -----------------------------
-    refund.status = "processed"
-    refund.processed_at = datetime.utcnow()
-
-    db.commit()
-    db.refresh(refund)
 
-    # -----------------------------
-    # Trigger webhook
-    # -----------------------------
+def _refund_webhook(refund) -> str:
     webhook_payload = {
         "event": "refund.processed",
         "timestamp": int(time.time()),
@@ -72,9 +53,102 @@ def process_refund_job(db: Session, refund_id: str):
             }
         }
     }
-
-    redis_client.rpush(WEBHOOK_QUEUE, json.dumps({
+    return json.dumps({
         "merchant_id": refund.merchant_id,
         "event": "refund.processed",
         "payload": webhook_payload
-    }))
\ No newline at end of file
+    })
+
+
+# =====================================================
+# Worker: process a batch of refunds
+# =====================================================
+def process_refund_batch(db: Session, refund_ids: list, executor=None) -> dict:
+    """
+    Settle a batch of refunds: one IN (...) query per table, gateway calls
+    in parallel on `executor` with no transaction open, and a single
+    commit for every outcome.
+
+    Returns {refund_id: None | exception}. A failed commit raises, and the
+    caller retries the whole batch (settled refunds are skipped on replay).
+    """
+    refund_ids = list(dict.fromkeys(refund_ids))
+    results = {}
+
+    refunds = {r.id: r for r in db.query(Refund).filter(Refund.id.in_(refund_ids)).all()}
+    payments = {
+        p.id: p.order_id
+        for p in db.query(Payment.id, Payment.order_id)
+        .filter(Payment.id.in_({r.payment_id for r in refunds.values()}))
+        .all()
+    }
+    order_ids = {
+        row.id
+        for row in db.query(Order.id).filter(Order.id.in_({o for o in payments.values() if o})).all()
+    }
+
+    pending = []
+    for refund_id in refund_ids:
+        refund = refunds.get(refund_id)
+        if not refund:
+            results[refund_id] = TerminalError(f"Refund {refund_id} not found")
+        elif refund.payment_id not in payments:
+            results[refund_id] = TerminalError("Payment not found")
+        elif payments[refund.payment_id] not in order_ids:
+            results[refund_id] = TerminalError("Order not found")
+        elif refund.status == "processed":
+            # Redelivered job for a refund that already settled
+            results[refund_id] = None
+        else:
+            pending.append(refund)
+
+    if not pending:
+        return results
+
+    # Nothing to write yet: end the read transaction so the pooled
+    # connection isn't left idle in transaction during the gateway calls.
+    # Rollback expires the instances, so only the ids are used from here on.
+    pending_ids = [refund.id for refund in pending]
+    db.rollback()
+
+    # -----------------------------
+    # Gateway calls (concurrent)
+    # -----------------------------
+    map_fn = executor.map if executor else map
+    list(map_fn(settle_with_gateway, pending_ids))
+
+    # -----------------------------
+    # Outcomes (one transaction)
+    # -----------------------------
+    now = datetime.utcnow()
+    totals = defaultdict(lambda: [0, 0])
+    webhooks = []
+    settled = db.query(Refund).filter(Refund.id.in_(pending_ids)).with_for_update().all()
+    for refund in settled:
+        results[refund.id] = None
+        # Another worker (redelivered job) finished it while we were waiting
+        if refund.status == "processed":
+            continue
+        refund.status = "processed"
+        refund.processed_at = now
+        totals[refund.merchant_id][0] += 1
+        totals[refund.merchant_id][1] += refund.amount
+        # Built before commit, which would expire every instance
+        webhooks.append(_refund_webhook(refund))
+
+    for merchant_id, (count, amount) in totals.items():
+        record_metrics(db, merchant_id, refunds_processed=count, refund_amount=amount)
+
+    db.commit()
+
+    # -----------------------------
+    # Trigger webhooks
+    # -----------------------------
+    webhook_queue.enqueue_many(webhooks)
+    return results
+
+
+def process_refund_job(db: Session, refund_id: str):
+    error = process_refund_batch(db, [refund_id])[refund_id]
+    if error:
+        raise error
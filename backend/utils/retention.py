@@ -0,0 +1,78 @@
+import os
+import time
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+
+# -----------------------------
+# Config
+# -----------------------------
+# Rows per DELETE; each batch is its own short transaction so writers
+# inserting new keys never wait behind a long purge.
+IDEMPOTENCY_PURGE_BATCH = int(os.getenv("IDEMPOTENCY_PURGE_BATCH", "5000"))
+IDEMPOTENCY_PURGE_MAX_BATCHES = int(os.getenv("IDEMPOTENCY_PURGE_MAX_BATCHES", "200"))
+IDEMPOTENCY_PURGE_PAUSE_SEC = float(os.getenv("IDEMPOTENCY_PURGE_PAUSE_SEC", "0.05"))
+
+RETENTION_STATS_KEY = "retention:idempotency_keys"
+
+# Oldest expired rows first via idx_idempotency_keys_expires_at; rows a
+# concurrent transaction has locked are skipped and picked up next pass.
+PURGE_BATCH_SQL = text("""
+    DELETE FROM idempotency_keys
+    WHERE id IN (
+        SELECT id FROM idempotency_keys
+        WHERE expires_at < now()
+        ORDER BY expires_at
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+
+def purge_expired_idempotency_keys(
+    engine,
+    batch_size: int = IDEMPOTENCY_PURGE_BATCH,
+    max_batches: int = IDEMPOTENCY_PURGE_MAX_BATCHES,
+    pause: float = IDEMPOTENCY_PURGE_PAUSE_SEC,
+) -> dict:
+    """
+    Delete expired idempotency keys in bounded batches until none are left
+    (or max_batches is reached). Returns rows removed and time taken.
+    """
+    started = time.perf_counter()
+    deleted = 0
+    batches = 0
+
+    while batches < max_batches:
+        with engine.begin() as conn:
+            removed = conn.execute(PURGE_BATCH_SQL, {"batch": batch_size}).rowcount
+        batches += 1
+        deleted += removed
+        if removed < batch_size:
+            break
+        time.sleep(pause)
+
+    return {
+        "table": "idempotency_keys",
+        "deleted": deleted,
+        "batches": batches,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+
+
+def run_idempotency_purge(engine, redis_client) -> dict:
+    report = purge_expired_idempotency_keys(engine)
+    logging.info(
+        f"🧹 Purged {report['deleted']} expired idempotency keys "
+        f"in {report['batches']} batch(es), {report['duration_ms']} ms"
+    )
+    redis_client.set(RETENTION_STATS_KEY, json.dumps(report))
+    return report
+
+
+def last_purge_report(redis_client):
+    raw = redis_client.get(RETENTION_STATS_KEY)
+    return json.loads(raw) if raw else None
@@ -0,0 +1,130 @@
+import os
+import time
+import random
+import threading
+
+import redis
+from sqlalchemy.exc import OperationalError, DisconnectionError
+
+# -----------------------------
+# Config
+# -----------------------------
+RETRY_PROMOTE_INTERVAL_SEC = float(os.getenv("RETRY_PROMOTE_INTERVAL_SEC", "0.5"))
+RETRY_PROMOTE_BATCH = int(os.getenv("RETRY_PROMOTE_BATCH", "100"))
+
+
+# -----------------------------
+# Error classification
+# -----------------------------
+class RetryableError(Exception):
+    """Transient failure: the same job may succeed later."""
+
+
+class TerminalError(Exception):
+    """Permanent failure: retrying cannot help, send to the DLQ."""
+
+
+TRANSIENT_ERRORS = (
+    RetryableError,
+    OperationalError,
+    DisconnectionError,
+    redis.ConnectionError,
+    redis.TimeoutError,
+)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, TerminalError):
+        return False
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+# -----------------------------
+# Backoff policy
+# -----------------------------
+class RetryPolicy:
+    """
+    Exponential backoff (base_delay * 2^(n-1), capped at max_delay) or an
+    explicit per-attempt schedule, with equal jitter so retries from a burst
+    of failures spread out instead of landing together.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        schedule: list | None = None,
+        jitter: float = 0.5,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.schedule = schedule
+        self.jitter = jitter
+
+    def delay_for(self, attempt: int):
+        """
+        Delay in seconds before retry number `attempt` (1-based),
+        or None once the policy is exhausted.
+        """
+        if attempt > self.max_attempts:
+            return None
+        if self.schedule:
+            delay = self.schedule[min(attempt, len(self.schedule)) - 1]
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+# -----------------------------
+# Delay queue (sorted set per queue)
+# -----------------------------
+# Moves due members to the main queue in one atomic step, so concurrent
+# promoters on several replicas never push the same retry twice.
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    if ARGV[3] == 'stream' then
+        redis.call('XADD', KEYS[2], '*', 'data', member)
+    else
+        redis.call('RPUSH', KEYS[2], member)
+    end
+end
+return #due
+"""
+
+
+def delayed_key(queue_name: str) -> str:
+    return f"{queue_name}:delayed"
+
+
+def schedule_retry(queue, payload: str, delay: float):
+    queue.client.zadd(delayed_key(queue.name), {payload: time.time() + delay})
+
+
+def promote_due(queue, batch: int = RETRY_PROMOTE_BATCH) -> int:
+    promote = queue.client.register_script(PROMOTE_SCRIPT)
+    return promote(
+        keys=[delayed_key(queue.name), queue.name],
+        args=[time.time(), batch, queue.backend],
+    )
+
+
+def _promoter_loop(queues):
+    while True:
+        for queue in queues:
+            try:
+                # Drain everything that is due, one bounded batch at a time
+                while promote_due(queue) >= RETRY_PROMOTE_BATCH:
+                    pass
+            except Exception as e:
+                print(f"⚠️ Retry promoter error on {queue.name}: {e}")
+        time.sleep(RETRY_PROMOTE_INTERVAL_SEC)
+
+
+def start_retry_promoter(queues):
+    thread = threading.Thread(target=_promoter_loop, args=(queues,), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,101 @@
+import os
+import math
+import time
+import random
+import socket
+
+import redis
+
+# -----------------------------
+# Config
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+# Extend the lease only while we still own it
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ShardLeases:
+    """
+    Splits `shards` hash shards between the live replicas of one worker.
+
+    Every replica heartbeats into a sorted set, and holds a Redis lease
+    (SET NX PX) per shard it owns. On each rebalance() it renews its
+    leases, claims free shards up to its fair share of
+    ceil(shards / live replicas), and releases any extras so new replicas
+    can pick them up. A replica that dies stops renewing, and its shards
+    are free again after `ttl_sec`.
+    """
+
+    def __init__(self, name: str, shards: int, ttl_sec: float, client=None, owner: str = ""):
+        self.name = name
+        self.shards = shards
+        self.ttl_ms = int(ttl_sec * 1000)
+        self.client = client or redis_client
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.owned: set[int] = set()
+        self._renew = self.client.register_script(RENEW_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def _key(self, shard: int) -> str:
+        return f"{self.name}:shard:{shard}"
+
+    @property
+    def _replicas_key(self) -> str:
+        return f"{self.name}:replicas"
+
+    def live_replicas(self) -> int:
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(self._replicas_key, {self.owner: now})
+        pipe.zremrangebyscore(self._replicas_key, "-inf", now - self.ttl_ms / 1000)
+        pipe.zcard(self._replicas_key)
+        return max(1, pipe.execute()[-1])
+
+    def rebalance(self) -> list:
+        """
+        Returns the sorted list of shards this replica owns for the next pass.
+        """
+        for shard in list(self.owned):
+            if not self._renew(keys=[self._key(shard)], args=[self.owner, self.ttl_ms]):
+                self.owned.discard(shard)
+
+        target = math.ceil(self.shards / self.live_replicas())
+
+        if len(self.owned) < target:
+            free = [shard for shard in range(self.shards) if shard not in self.owned]
+            # Random order so replicas starting together don't race for the same shards
+            random.shuffle(free)
+            for shard in free:
+                if len(self.owned) >= target:
+                    break
+                if self.client.set(self._key(shard), self.owner, nx=True, px=self.ttl_ms):
+                    self.owned.add(shard)
+
+        while len(self.owned) > target:
+            self.release(max(self.owned))
+
+        return sorted(self.owned)
+
+    def release(self, shard: int):
+        self._release(keys=[self._key(shard)], args=[self.owner])
+        self.owned.discard(shard)
+
+    def release_all(self):
+        for shard in list(self.owned):
+            self.release(shard)
+        self.client.zrem(self._replicas_key, self.owner)
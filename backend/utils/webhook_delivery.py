@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import threading
+from typing import NamedTuple, Optional
+
+import aiohttp
+
+# -----------------------------
+# Config
+# -----------------------------
+WEBHOOK_CONNECT_TIMEOUT_SEC = float(os.getenv("WEBHOOK_CONNECT_TIMEOUT_SEC", "2"))
+WEBHOOK_READ_TIMEOUT_SEC = float(os.getenv("WEBHOOK_READ_TIMEOUT_SEC", "5"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "200"))
+# Concurrent keep-alive connections per merchant host. aiohttp does not
+# pipeline HTTP/1.1 requests, so this is the per-host in-flight cap.
+WEBHOOK_MAX_CONNECTIONS_PER_HOST = int(os.getenv("WEBHOOK_MAX_CONNECTIONS_PER_HOST", "10"))
+WEBHOOK_KEEPALIVE_SEC = float(os.getenv("WEBHOOK_KEEPALIVE_SEC", "30"))
+WEBHOOK_RESPONSE_BODY_LIMIT = 1000
+
+
+class DeliveryResult(NamedTuple):
+    status_code: Optional[int]
+    body: Optional[str]
+    error: Optional[str]
+    elapsed: float
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code is not None and 200 <= self.status_code < 300
+
+
+class WebhookDeliveryEngine:
+    """
+    Pooled keep-alive HTTP client on a private event loop thread.
+
+    Sync callers (worker threads) submit requests with post()/post_many();
+    every caller shares one connection pool, so repeat deliveries to the same
+    host reuse warm TCP/TLS connections instead of handshaking each time.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = WEBHOOK_CONNECT_TIMEOUT_SEC,
+        read_timeout: float = WEBHOOK_READ_TIMEOUT_SEC,
+        max_connections: int = WEBHOOK_MAX_CONNECTIONS,
+        max_connections_per_host: int = WEBHOOK_MAX_CONNECTIONS_PER_HOST,
+        keepalive: float = WEBHOOK_KEEPALIVE_SEC,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive = keepalive
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="webhook-http", daemon=True)
+        self._thread.start()
+        self._session = self._run(self._create_session())
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def _post(self, url: str, body: str, headers: dict) -> DeliveryResult:
+        started = time.perf_counter()
+        try:
+            async with self._session.post(url, data=body.encode(), headers=headers) as resp:
+                text = await resp.text(errors="replace")
+                return DeliveryResult(resp.status, text[:WEBHOOK_RESPONSE_BODY_LIMIT], None, time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            return DeliveryResult(None, None, "timeout", time.perf_counter() - started)
+        except aiohttp.ClientError as e:
+            return DeliveryResult(None, None, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+
+    async def _post_many(self, items):
+        return await asyncio.gather(*(self._post(url, body, headers) for url, body, headers in items))
+
+    def post(self, url: str, body: str, headers: dict) -> DeliveryResult:
+        return self._run(self._post(url, body, headers))
+
+    def post_many(self, items) -> list:
+        """
+        items: iterable of (url, body, headers); sent concurrently.
+        """
+        return self._run(self._post_many(list(items)))
+
+    def close(self):
+        self._run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_delivery_engine() -> WebhookDeliveryEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = WebhookDeliveryEngine()
+        return _engine
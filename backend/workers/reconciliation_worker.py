@@ -1,83 +1,196 @@
 import os
 import time
 import json
+import signal
 import logging
+from collections import Counter
 from datetime import datetime, timedelta
 
 import redis
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select, update, insert, func
 from sqlalchemy.exc import ProgrammingError, OperationalError
 
+from database import engine, SessionLocal
 from models.payment import Payment
 from models.reconciliation import PaymentLog
+from utils.retention import run_idempotency_purge
+from utils.metrics import record_metrics
+from utils.payment_events import publish_payment_status
+from utils.read_cache import invalidate
+from utils.shard_lease import ShardLeases
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 PROCESSING_THRESHOLD = int(os.getenv("PROCESSING_THRESHOLD_SEC", "300"))
+# Stuck payments failed per transaction
+RECONCILE_CHUNK_SIZE = max(1, int(os.getenv("RECONCILE_CHUNK_SIZE", "1000")))
+IDEMPOTENCY_PURGE_INTERVAL_SEC = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SEC", "3600"))
+
+# Payments are split into hash shards; replicas share them through Redis leases
+RECONCILE_SHARDS = max(1, int(os.getenv("RECONCILE_SHARDS", "16")))
+RECONCILE_LEASE_TTL_SEC = float(os.getenv("RECONCILE_LEASE_TTL_SEC", "90"))
+# Pause between passes: back to the minimum when a pass found stuck
+# payments, doubling up to the maximum while shards stay clean
+RECONCILE_MIN_INTERVAL_SEC = float(os.getenv("RECONCILE_MIN_INTERVAL_SEC", "5"))
+RECONCILE_MAX_INTERVAL_SEC = float(os.getenv("RECONCILE_MAX_INTERVAL_SEC", "30"))
 
 ALERT_QUEUE = "gateway_alerts"
+PURGE_LEASE_KEY = "reconcile:idempotency_purge"
 WORKER_ID = "reconciliation_worker"
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+leases = ShardLeases("reconcile", RECONCILE_SHARDS, RECONCILE_LEASE_TTL_SEC, client=redis_client)
+running = True
+
+
+def graceful_shutdown(signum, frame):
+    global running
+    logging.info("🛑 Reconciliation worker shutting down, releasing shards...")
+    running = False
+
+
+def shard_of(payment_id):
+    # Postgres' hashtext(), masked to non-negative
+    return func.hashtext(payment_id).op("&")(0x7FFFFFFF) % RECONCILE_SHARDS
+
+
+def _stuck_chunk(stuck_threshold: datetime, shards: list | None):
+    """
+    UPDATE ... RETURNING over at most RECONCILE_CHUNK_SIZE stuck payments.
+    SKIP LOCKED leaves rows a payment worker is finishing right now alone.
+    """
+    stuck_ids = select(Payment.id).where(
+        Payment.status == "PROCESSING",
+        Payment.updated_at < stuck_threshold,
+    )
+    if shards is not None:
+        stuck_ids = stuck_ids.where(shard_of(Payment.id).in_(shards))
+    stuck_ids = (
+        stuck_ids
+        .order_by(Payment.updated_at)
+        .limit(RECONCILE_CHUNK_SIZE)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Payment)
+        .where(Payment.id.in_(stuck_ids), Payment.status == "PROCESSING")
+        .values(
+            status="FAILED",
+            error_code="STUCK_PROCESSING",
+            error_description="Payment stuck in PROCESSING beyond threshold",
+        )
+        .returning(Payment)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_chunk(db, stuck_threshold: datetime, shards: list | None) -> int:
+    payments = db.scalars(_stuck_chunk(stuck_threshold, shards)).all()
+    if not payments:
+        return 0
+
+    db.execute(insert(PaymentLog), [
+        {"payment_id": payment.id, "old_status": "PROCESSING", "new_status": payment.status, "worker_id": WORKER_ID}
+        for payment in payments
+    ])
+    for merchant_id, count in Counter(payment.merchant_id for payment in payments).items():
+        record_metrics(db, merchant_id, payments_failed=count)
+    db.commit()
+
+    payment_ids = [payment.id for payment in payments]
+    invalidate(redis_client, payment_ids=payment_ids)
+
+    timestamp = datetime.utcnow().isoformat()
+    pipe = redis_client.pipeline(transaction=False)
+    for payment in payments:
+        publish_payment_status(pipe, payment)
+    pipe.rpush(ALERT_QUEUE, *[
+        json.dumps({"payment_id": payment_id, "issue": "stuck_processing", "timestamp": timestamp})
+        for payment_id in payment_ids
+    ])
+    pipe.execute()
+
+    logging.warning(f"Reconciled {len(payments)} stuck payment(s)")
+    return len(payments)
+
 
-def reconcile_payments():
-    db = SessionLocal()
+def reconcile_payments(shards: list | None = None) -> int:
+    """
+    Sweep the given shards (all of them when None, e.g. a manual run).
+    If a lease is lost mid-pass, the status check and SKIP LOCKED still
+    keep two replicas from failing the same payment.
+    """
+    if shards is not None and not shards:
+        return 0
+
+    # Instances stay readable after commit for the Redis fan-out
+    db = SessionLocal(expire_on_commit=False)
     try:
-        now = datetime.utcnow()
-        stuck_threshold = now - timedelta(seconds=PROCESSING_THRESHOLD)
-
-        payments = db.query(Payment).filter(
-            Payment.status == "PROCESSING",
-            Payment.updated_at < stuck_threshold
-        ).all()
-
-        if not payments:
-            return
-
-        for payment in payments:
-            old_status = payment.status
-            payment.status = "FAILED"
-            payment.error_code = "STUCK_PROCESSING"
-            payment.error_description = "Payment stuck in PROCESSING beyond threshold"
-            db.commit()
-
-            log = PaymentLog(payment_id=payment.id, old_status=old_status, new_status=payment.status, worker_id=WORKER_ID)
-            db.add(log)
-            db.commit()
-
-            redis_client.rpush(ALERT_QUEUE, json.dumps({
-                "payment_id": payment.id,
-                "issue": "stuck_processing",
-                "timestamp": datetime.utcnow().isoformat()
-            }))
-
-            logging.warning(f"Reconciled stuck payment {payment.id}")
+        stuck_threshold = datetime.utcnow() - timedelta(seconds=PROCESSING_THRESHOLD)
+        total = 0
+        while True:
+            count = reconcile_chunk(db, stuck_threshold, shards)
+            total += count
+            if count < RECONCILE_CHUNK_SIZE:
+                return total
+            db.expunge_all()
     finally:
         db.close()
 
+def run_purge_once_per_interval():
+    """
+    Any replica may run the purge, but only one per interval.
+    """
+    if not redis_client.set(PURGE_LEASE_KEY, leases.owner, nx=True, ex=IDEMPOTENCY_PURGE_INTERVAL_SEC):
+        return
+    try:
+        run_idempotency_purge(engine, redis_client)
+    except Exception:
+        # Let the next pass (on any replica) try again
+        redis_client.delete(PURGE_LEASE_KEY)
+        raise
+
+
 def worker_loop():
-    logging.info("🟢 Reconciliation worker started")
-    while True:
+    signal.signal(signal.SIGINT, graceful_shutdown)
+    signal.signal(signal.SIGTERM, graceful_shutdown)
+    logging.info(f"🟢 Reconciliation worker {leases.owner} started ({RECONCILE_SHARDS} shards)")
+    interval = RECONCILE_MIN_INTERVAL_SEC
+    shards = []
+    while running:
+        found = 0
         try:
-            reconcile_payments()
+            owned = leases.rebalance()
+            if owned != shards:
+                logging.info(f"Reconciliation shards: {owned}")
+                shards = owned
+            found = reconcile_payments(shards)
         except (ProgrammingError, OperationalError):
             logging.warning("DB not ready yet, retrying...")
         except Exception:
             logging.exception("Unexpected reconciliation error")
-        time.sleep(60)
+
+        try:
+            run_purge_once_per_interval()
+        except (ProgrammingError, OperationalError):
+            logging.warning("DB not ready yet, idempotency purge postponed")
+        except Exception:
+            logging.exception("Unexpected idempotency purge error")
+
+        interval = RECONCILE_MIN_INTERVAL_SEC if found else min(interval * 2, RECONCILE_MAX_INTERVAL_SEC)
+        deadline = time.monotonic() + interval
+        while running and time.monotonic() < deadline:
+            time.sleep(0.5)
+
+    leases.release_all()
+    logging.info("🛑 Reconciliation worker stopped")
 
 if __name__ == "__main__":
-    try:
-        import sys
-        import os
-        sys.path.append(os.getcwd())
-        from migrate import migrate
-        migrate()
-    except Exception:
-        pass
+    import sys
+    import os
+    sys.path.append(os.getcwd())
+    from migrate import ensure_schema
+    ensure_schema()
     worker_loop()
\ No newline at end of file
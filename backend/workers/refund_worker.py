@@ -2,9 +2,12 @@ import os
 import json
 import time
 import redis
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from utils.refund_processor import process_refund_job
+from utils.refund_processor import process_refund_batch
+from utils.job_queue import get_queue
+from utils.retry import RetryPolicy, TerminalError, is_retryable, schedule_retry, start_retry_promoter
 
 # -----------------------------
 # Redis config
@@ -13,44 +16,105 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 REFUND_QUEUE = os.getenv("REFUND_QUEUE", "gateway_refunds")
 DLQ_QUEUE = os.getenv("REFUND_DLQ_QUEUE", "gateway_refunds_dlq")
 
+MAX_RETRIES = int(os.getenv("REFUND_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = float(os.getenv("REFUND_RETRY_BASE_DELAY_SEC", "5"))
+RETRY_MAX_DELAY = float(os.getenv("REFUND_RETRY_MAX_DELAY_SEC", "300"))
+
+# Jobs pulled per batch (one DB round trip per table, one commit)
+REFUND_BATCH_SIZE = max(1, int(os.getenv("REFUND_BATCH_SIZE", "64")))
+# Gateway calls in flight at once
+REFUND_CONCURRENCY = max(1, int(os.getenv("REFUND_CONCURRENCY", "16")))
+REFUND_STATS_INTERVAL_SEC = float(os.getenv("REFUND_STATS_INTERVAL_SEC", "60"))
+
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+refund_queue = get_queue(REFUND_QUEUE, dlq=DLQ_QUEUE, client=redis_client)
+retry_policy = RetryPolicy(MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY)
+
+executor = ThreadPoolExecutor(max_workers=REFUND_CONCURRENCY, thread_name_prefix="refund")
+
+
+def handle_failure(payload: str, job: dict, e: Exception):
+    retries = job.get("retries", 0) if isinstance(job, dict) else 0
+    delay = retry_policy.delay_for(retries + 1) if is_retryable(e) else None
+    if delay is None:
+        print(f"⚠️ Failed to process refund job: {e}")
+        redis_client.rpush(DLQ_QUEUE, payload)
+    else:
+        job["retries"] = retries + 1
+        schedule_retry(refund_queue, json.dumps(job), delay)
+        print(f"🔁 Retry {job['retries']} for refund {job.get('refund_id')} in {delay:.1f}s: {e}")
+
+
+def handle_batch(items: list) -> int:
+    """
+    Process one batch of queue items; returns how many refunds succeeded.
+    """
+    jobs = []
+    for item in items:
+        job = {}
+        try:
+            job = json.loads(item.payload)
+            if not job.get("refund_id"):
+                raise TerminalError("Missing refund_id in job payload")
+            jobs.append((item, job))
+        except Exception as e:
+            handle_failure(item.payload, job, e)
+
+    if not jobs:
+        return 0
+
+    refund_ids = [job["refund_id"] for _, job in jobs]
+    db: Session = SessionLocal()
+    try:
+        results = process_refund_batch(db, refund_ids, executor=executor)
+    except Exception as e:
+        # Nothing was committed; every job in the batch shares the error
+        db.rollback()
+        results = {refund_id: e for refund_id in refund_ids}
+    finally:
+        db.close()
+
+    succeeded = 0
+    for item, job in jobs:
+        error = results.get(job["refund_id"])
+        if error:
+            handle_failure(item.payload, job, error)
+        else:
+            succeeded += 1
+    return succeeded
+
 
 # -----------------------------
 # Worker loop
 # -----------------------------
 def worker_loop():
-    print("🟢 Refund worker started")
-    while True:
-        item = redis_client.blpop(REFUND_QUEUE, timeout=5)
-        if not item:
-            continue
+    print(f"🟢 Refund worker started (batch={REFUND_BATCH_SIZE}, concurrency={REFUND_CONCURRENCY})")
+    start_retry_promoter([refund_queue])
 
-        _, payload = item
+    processed = 0
+    window_start = time.monotonic()
+    while True:
+        items = refund_queue.dequeue_batch(REFUND_BATCH_SIZE, timeout=5)
         try:
-            job = json.loads(payload)
-            refund_id = job.get("refund_id")
-            if not refund_id:
-                raise ValueError("Missing refund_id in job payload")
-
-            # -----------------------------
-            # Process refund
-            # -----------------------------
-            db: Session = SessionLocal()
-            try:
-                process_refund_job(db, refund_id)
-            finally:
-                db.close()
-
+            if items:
+                processed += handle_batch(items)
         except Exception as e:
-            print(f"⚠️ Failed to process refund job: {e}")
-            redis_client.rpush(DLQ_QUEUE, payload)
-            continue
+            print(f"⚠️ Refund batch error: {e}")
+            for item in items:
+                redis_client.rpush(DLQ_QUEUE, item.payload)
+        finally:
+            for item in items:
+                refund_queue.ack(item)
+
+        elapsed = time.monotonic() - window_start
+        if elapsed >= REFUND_STATS_INTERVAL_SEC:
+            if processed:
+                print(f"📈 Refund throughput: {processed / elapsed:.1f} refunds/sec ({processed} in {elapsed:.0f}s)")
+            processed = 0
+            window_start = time.monotonic()
 
 
 if __name__ == "__main__":
-    try:
-        from migrate import migrate
-        migrate()
-    except Exception:
-        pass
-    worker_loop()
\ No newline at end of file
+    from migrate import ensure_schema
+    ensure_schema()
+    worker_loop()
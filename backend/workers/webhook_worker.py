@@ -1,44 +1,70 @@
 import os
 import json
 import redis
-import requests
 import signal
 import time
 import threading
-from datetime import datetime, timedelta
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_
 import hmac
 import hashlib
+import uuid
+from collections import Counter, defaultdict
 
-from models import Merchant, Webhook, WebhookLog
-from database import Base
+from models import Webhook, WebhookLog
+from database import SessionLocal
+from utils.job_queue import get_queue
+from utils.retry import RetryPolicy, schedule_retry, start_retry_promoter
+from utils.webhook_delivery import get_delivery_engine
+from utils.circuit_breaker import EndpointBreakers, is_retryable_status
+from utils.metrics import record_metrics
 
 # -----------------------------
 # Config
 # -----------------------------
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 QUEUE_NAME = os.getenv("WEBHOOK_QUEUE", "gateway_webhooks")
-DATABASE_URL = os.getenv("DATABASE_URL")
+DLQ_QUEUE = os.getenv("WEBHOOK_DLQ_QUEUE", "gateway_webhooks_dlq")
 WEBHOOK_RETRY_INTERVALS_TEST = os.getenv("WEBHOOK_RETRY_INTERVALS_TEST", "true").lower() == "true"
+# Retries normally come back through the delay queue; the DB scheduler
+# drains rows overdue by more than the grace (lost entries, backlogs).
+WEBHOOK_SWEEP_INTERVAL_SEC = float(os.getenv("WEBHOOK_SWEEP_INTERVAL_SEC", "5"))
+WEBHOOK_SWEEP_GRACE_SEC = float(os.getenv("WEBHOOK_SWEEP_GRACE_SEC", "30"))
+# Rows claimed per scheduler transaction, and how long a claim is exclusive
+WEBHOOK_CLAIM_BATCH = int(os.getenv("WEBHOOK_CLAIM_BATCH", "100"))
+WEBHOOK_LEASE_SEC = float(os.getenv("WEBHOOK_LEASE_SEC", "60"))
+# Webhook jobs handled at once by this process (HTTP goes through the shared pool)
+WEBHOOK_CONCURRENCY = max(1, int(os.getenv("WEBHOOK_CONCURRENCY", "16")))
+# Give up on logs an open circuit has kept deferring for longer than this
+WEBHOOK_MAX_DEFER_SEC = float(os.getenv("WEBHOOK_MAX_DEFER_SEC", "86400"))
 
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+webhook_queue = get_queue(QUEUE_NAME, dlq=DLQ_QUEUE, client=redis_client)
 
 running = True
 
+executor = ThreadPoolExecutor(max_workers=WEBHOOK_CONCURRENCY, thread_name_prefix="webhook")
+slots = threading.BoundedSemaphore(WEBHOOK_CONCURRENCY)
+breakers = EndpointBreakers(client=redis_client)
+
 # -----------------------------
 # Retry Intervals
 # -----------------------------
 PROD_RETRY_INTERVALS = [0, 60, 300, 1800, 7200]  # seconds
 TEST_RETRY_INTERVALS = [0, 5, 10, 15, 20]     # seconds
 
-def get_retry_delay(attempt: int) -> int:
-    intervals = TEST_RETRY_INTERVALS if WEBHOOK_RETRY_INTERVALS_TEST else PROD_RETRY_INTERVALS
-    if attempt < len(intervals):
-        return intervals[attempt]
-    return -1
+_intervals = TEST_RETRY_INTERVALS if WEBHOOK_RETRY_INTERVALS_TEST else PROD_RETRY_INTERVALS
+# intervals[0] is the immediate first delivery; the rest are the retry schedule
+retry_policy = RetryPolicy(len(_intervals) - 1, schedule=_intervals[1:], jitter=0.2)
+
+
+def get_retry_delay(attempt: int):
+    return retry_policy.delay_for(attempt)
+
+
+def schedule_redelivery(log_id: str, delay: float):
+    schedule_retry(webhook_queue, json.dumps({"log_id": log_id}), delay)
 
 # -----------------------------
 # Signature Logic
@@ -53,147 +79,367 @@ def generate_signature(secret: str, payload_str: str) -> str:
 # -----------------------------
 # Delivery Logic
 # -----------------------------
-def deliver_webhook(db, log_id: str):
-    log = db.query(WebhookLog).filter(WebhookLog.id == log_id).first()
-    if not log:
-        return
+# Every delivery runs in three steps so no DB connection is held across
+# network I/O:
+#   1. claim   – short transaction: lock rows (FOR UPDATE SKIP LOCKED),
+#                stamp a lease, snapshot url/secret/payload, commit
+#   2. deliver – HTTP through the pooled engine, no session open
+#   3. record  – short transaction: write outcomes for rows we still lease
+# A worker that dies mid-delivery just lets its lease expire; the row is
+# then claimable again by any replica.
+
+def _lease_fields():
+    return uuid.uuid4().hex, datetime.utcnow() + timedelta(seconds=WEBHOOK_LEASE_SEC)
+
+
+def _build_tasks(db, logs: list) -> list:
+    webhook_ids = {log.webhook_id for log in logs if log.webhook_id}
+    webhooks = {
+        webhook.id: webhook
+        for webhook in db.query(Webhook).filter(Webhook.id.in_(webhook_ids)).all()
+    } if webhook_ids else {}
+
+    tasks = []
+    for log in logs:
+        webhook = webhooks.get(log.webhook_id)
+        if not webhook or not webhook.active:
+            log.status = "failed"
+            log.next_retry_at = None
+            log.lease_owner = None
+            log.lease_expires_at = None
+            log.response_body = "Webhook subscription missing or inactive"
+            continue
+
+        payload_str = json.dumps(log.payload, separators=(",", ":"))
+        tasks.append({
+            "log_id": log.id,
+            "lease_owner": log.lease_owner,
+            "attempt": log.attempts + 1,
+            "url": webhook.url,
+            "body": payload_str,
+            "headers": {
+                "Content-Type": "application/json",
+                "X-Webhook-Signature": generate_signature(webhook.secret, payload_str)
+            },
+        })
+    return tasks
+
+
+def create_delivery_logs(merchant_id: str, event: str, payload: dict) -> list:
+    """
+    One WebhookLog per active subscription, so each endpoint is attempted,
+    recorded and retried on its own. Rows are created already leased to
+    this worker and returned as delivery tasks.
+    """
+    db = SessionLocal()
+    try:
+        webhooks = db.query(Webhook).filter(Webhook.merchant_id == merchant_id, Webhook.active == True).all()
+        if not webhooks:
+            db.add(WebhookLog(
+                merchant_id=merchant_id,
+                event=event,
+                payload=payload,
+                status="failed",
+                attempts=0,
+                response_body="No active webhooks configured for merchant",
+            ))
+            db.commit()
+            return []
 
-    # Fetch merchant for URL and Secret
-    # Use merchant_id from log
-    merchant = db.query(Merchant).filter(Merchant.id == log.merchant_id).first()
-    
-    # Requirement says fetch merchant details: retrieve webhook_url (must be configured)
-    # Since we have multiple webhooks in the 'webhooks' table, let's find the one matching the event or all.
-    # Actually, the register_webhook router stores them in 'webhooks' table.
-    # Let's assume we use the first active webhook for that merchant or all.
-    # The requirement says "retrieve webhook_url (skip if NULL)".
-    
+        owner, expires_at = _lease_fields()
+        logs = [
+            WebhookLog(
+                merchant_id=merchant_id,
+                webhook_id=webhook.id,
+                event=event,
+                payload=payload,
+                status="pending",
+                attempts=0,
+                next_retry_at=datetime.utcnow(), # Immediate
+                lease_owner=owner,
+                lease_expires_at=expires_at,
+            )
+            for webhook in webhooks
+        ]
+        db.add_all(logs)
+        db.flush()
+        tasks = _build_tasks(db, logs)
+        db.commit()
+        return tasks
+    finally:
+        db.close()
+
+
+def _split_legacy_log(db, log) -> list:
+    """
+    Rows written before per-subscription records have no webhook_id: bind
+    this row to the first active subscription and clone it for the others.
+    """
     webhooks = db.query(Webhook).filter(Webhook.merchant_id == log.merchant_id, Webhook.active == True).all()
     if not webhooks:
-        log.status = "failed"
-        log.response_body = "No active webhooks configured for merchant"
+        return [log]
+
+    log.webhook_id = webhooks[0].id
+    clones = [
+        WebhookLog(
+            merchant_id=log.merchant_id,
+            webhook_id=webhook.id,
+            event=log.event,
+            payload=log.payload,
+            status="pending",
+            attempts=log.attempts,
+            next_retry_at=log.next_retry_at,
+            lease_owner=log.lease_owner,
+            lease_expires_at=log.lease_expires_at,
+        )
+        for webhook in webhooks[1:]
+    ]
+    db.add_all(clones)
+    db.flush()
+    return [log] + clones
+
+
+def claim_logs(log_ids: list | None = None, batch_size: int = None, due_before: datetime | None = None) -> list:
+    """
+    Lease pending logs (specific ids, or the oldest due ones) and return
+    them as delivery tasks. Rows locked or leased by another worker are
+    skipped, so any number of replicas can claim concurrently.
+    """
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        query = db.query(WebhookLog).filter(
+            WebhookLog.status == "pending",
+            or_(WebhookLog.lease_expires_at.is_(None), WebhookLog.lease_expires_at < now),
+        )
+        if log_ids:
+            query = query.filter(WebhookLog.id.in_(log_ids))
+        else:
+            query = query.filter(WebhookLog.next_retry_at <= (due_before or now)).order_by(WebhookLog.next_retry_at)
+
+        logs = query.limit(batch_size or WEBHOOK_CLAIM_BATCH).with_for_update(skip_locked=True).all()
+        if not logs:
+            return []
+
+        owner, expires_at = _lease_fields()
+        claimed = []
+        for log in logs:
+            log.lease_owner = owner
+            log.lease_expires_at = expires_at
+            claimed.extend(_split_legacy_log(db, log) if log.webhook_id is None else [log])
+
+        tasks = _build_tasks(db, claimed)
         db.commit()
-        return
+        return tasks
+    finally:
+        db.close()
 
-    # In this implementation, we log/retry for each webhook if there are multiple.
-    # But current WebhookLog schema has merchant_id instead of webhook_id (per requirement).
-    # So we'll iterate and send to all. (For simplicity, usually we'd have one log per delivery attempt).
-    
-    payload_str = json.dumps(log.payload, separators=(",", ":"))
-    
-    overall_success = True
-    for webhook in webhooks:
-        signature = generate_signature(webhook.secret, payload_str)
-        
-        try:
-            print(f"📡 Delivering webhook {log.id} to {webhook.url} (Attempt {log.attempts + 1})")
-            resp = requests.post(
-                webhook.url,
-                data=payload_str,
-                headers={
-                    "Content-Type": "application/json",
-                    "X-Webhook-Signature": signature
-                },
-                timeout=5
-            )
-            log.response_code = resp.status_code
-            log.response_body = resp.text[:1000] # Truncate if too long
-            
-            if 200 <= resp.status_code < 300:
-                print(f"✅ Webhook {log.id} SUCCESS")
-            else:
-                print(f"❌ Webhook {log.id} FAILED with {resp.status_code}")
-                overall_success = False
-        except Exception as e:
-            print(f"⚠️ Webhook {log.id} ERROR: {e}")
-            log.response_body = str(e)
-            overall_success = False
+
+def record_attempt(log, result):
+    """
+    Apply one delivery result to its log. Returns the retry delay, if any.
+    """
+    retryable = False
+    if result.error:
+        # Connection errors and timeouts are always worth another try
+        print(f"⚠️ Webhook {log.id} ERROR: {result.error}")
+        log.response_code = None
+        log.response_body = result.error
+        retryable = True
+    else:
+        log.response_code = result.status_code
+        log.response_body = result.body
+        if result.ok:
+            print(f"✅ Webhook {log.id} SUCCESS")
+        else:
+            print(f"❌ Webhook {log.id} FAILED with {result.status_code}")
+            retryable = is_retryable_status(result.status_code)
 
     log.attempts += 1
     log.last_attempt_at = datetime.utcnow()
+    log.lease_owner = None
+    log.lease_expires_at = None
 
-    if overall_success:
+    if result.ok:
         log.status = "success"
         log.next_retry_at = None
+        return None
+
+    delay = get_retry_delay(log.attempts) if retryable else None
+    if delay is not None:
+        log.status = "pending"
+        log.next_retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        print(f"🔁 Scheduled retry for {log.id} in {delay:.1f}s")
     else:
-        delay = get_retry_delay(log.attempts)
-        if delay >= 0:
-            log.status = "pending"
-            log.next_retry_at = datetime.utcnow() + timedelta(seconds=delay)
-            print(f"🔁 Scheduled retry for {log.id} in {delay}s")
-        else:
-            log.status = "failed"
-            log.next_retry_at = None
-            print(f"🛑 Webhook {log.id} permanently failed after 5 attempts")
+        log.status = "failed"
+        log.next_retry_at = None
+        print(f"🛑 Webhook {log.id} permanently failed after {log.attempts} attempt(s)")
+    return delay
+
+
+def record_deferral(log, retry_after: float):
+    """
+    Endpoint circuit is open (or the host is at its concurrency limit):
+    push the log back without spending an attempt. Returns the delay, if any.
+    """
+    log.lease_owner = None
+    log.lease_expires_at = None
+
+    created_at = log.created_at
+    if created_at and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    if created_at and (datetime.now(timezone.utc) - created_at).total_seconds() > WEBHOOK_MAX_DEFER_SEC:
+        log.status = "failed"
+        log.next_retry_at = None
+        log.response_body = "Endpoint circuit open; delivery window exceeded"
+        print(f"🛑 Webhook {log.id} failed: endpoint unavailable for too long")
+        return None
+
+    log.next_retry_at = datetime.utcnow() + timedelta(seconds=retry_after)
+    return retry_after
+
+
+def deliver_tasks(tasks: list):
+    """
+    POST every task to its own subscription concurrently, then record each
+    outcome in one short transaction and schedule per-log retries. Tasks for
+    endpoints whose circuit is open are deferred without an HTTP attempt.
+    """
+    if not tasks:
+        return
+
+    admissions = breakers.admit([task["url"] for task in tasks])
+    sent = [(task, admission) for task, admission in zip(tasks, admissions) if admission.allowed]
+    deferred = {
+        task["log_id"]: admission.retry_after
+        for task, admission in zip(tasks, admissions) if not admission.allowed
+    }
+
+    for task, admission in sent:
+        probe = " [probe]" if admission.probe else ""
+        print(f"📡 Delivering webhook {task['log_id']} to {task['url']} (Attempt {task['attempt']}){probe}")
+    for log_id, retry_after in deferred.items():
+        print(f"⏸️ Deferring webhook {log_id} for {retry_after:.1f}s (endpoint circuit open or at capacity)")
+
+    try:
+        results = get_delivery_engine().post_many(
+            (task["url"], task["body"], task["headers"]) for task, _ in sent
+        ) if sent else []
+    except Exception:
+        # Nothing will be recorded for these; don't leak their slots
+        breakers.release([admission for _, admission in sent])
+        raise
+    breakers.record([(admission, result) for (_, admission), result in zip(sent, results)])
+
+    retries = []
+    outcomes = defaultdict(Counter)
+    db = SessionLocal()
+    try:
+        by_id = {task["log_id"]: (task, result) for (task, _), result in zip(sent, results)}
+        leases = {task["log_id"]: task["lease_owner"] for task in tasks}
+        logs = db.query(WebhookLog).filter(WebhookLog.id.in_(list(leases))).with_for_update().all()
+        for log in logs:
+            # Lease expired and another worker took the row over; its result wins
+            if log.lease_owner != leases[log.id]:
+                print(f"⚠️ Lost lease on webhook {log.id}, discarding result")
+                continue
+            if log.id in deferred:
+                delay = record_deferral(log, deferred[log.id])
+            else:
+                delay = record_attempt(log, by_id[log.id][1])
+                if log.status == "success":
+                    outcomes[log.merchant_id]["webhooks_delivered"] += 1
+                elif log.status == "failed":
+                    outcomes[log.merchant_id]["webhooks_failed"] += 1
+                else:
+                    outcomes[log.merchant_id]["webhook_retries"] += 1
+            if delay is not None:
+                retries.append((log.id, delay))
+        for merchant_id, counts in outcomes.items():
+            record_metrics(db, merchant_id, **counts)
+        db.commit()
+    finally:
+        db.close()
+
+    for log_id, delay in retries:
+        schedule_redelivery(log_id, delay)
+
 
-    db.commit()
+def deliver_webhook(log_id: str):
+    deliver_tasks(claim_logs(log_ids=[log_id]))
 
 # -----------------------------
 # Worker Loops
 # -----------------------------
 def retry_scheduler():
-    print("⏲️ Webhook retry scheduler started")
+    print(f"⏲️ Webhook retry scheduler started (batch={WEBHOOK_CLAIM_BATCH})")
     while running:
-        db = SessionLocal()
+        claimed = 0
         try:
-            # Poll for pending logs that are due
-            pending_logs = db.query(WebhookLog).filter(
-                WebhookLog.status == "pending",
-                WebhookLog.next_retry_at <= datetime.utcnow()
-            ).limit(10).all()
-
-            for log in pending_logs:
-                deliver_webhook(db, log.id)
+            # Rows still on time are delivered via the delay queue; the DB
+            # scheduler drains everything past the grace period.
+            overdue = datetime.utcnow() - timedelta(seconds=WEBHOOK_SWEEP_GRACE_SEC)
+            tasks = claim_logs(due_before=overdue)
+            claimed = len(tasks)
+            deliver_tasks(tasks)
         except Exception as e:
             print(f"⚠️ Scheduler error: {e}")
-        finally:
-            db.close()
-        time.sleep(5)
+        # Keep draining while there is a backlog; idle-poll otherwise
+        if claimed < WEBHOOK_CLAIM_BATCH:
+            time.sleep(WEBHOOK_SWEEP_INTERVAL_SEC)
+
+def handle_job(payload: str):
+    job = json.loads(payload)
+
+    # Due retry promoted from the delay queue
+    if job.get("log_id"):
+        deliver_webhook(job["log_id"])
+        return
+
+    merchant_id = job.get("merchant_id")
+    event = job.get("event")
+    data_payload = job.get("payload")
+
+    if not merchant_id:
+        print("❌ Missing merchant_id in job")
+        return
+
+    # Fan out to every subscription at once
+    deliver_tasks(create_delivery_logs(merchant_id, event, data_payload))
+
+
+def _run_job(item):
+    try:
+        handle_job(item.payload)
+    except Exception as e:
+        print(f"⚠️ Webhook worker error: {e}")
+    finally:
+        # The WebhookLog row now owns retries, so the queue entry is done
+        webhook_queue.ack(item)
+        slots.release()
+
 
 def worker_loop():
-    print("🟢 Webhook worker started")
+    print(f"🟢 Webhook worker started (concurrency={WEBHOOK_CONCURRENCY})")
     # Start scheduler thread
     scheduler = threading.Thread(target=retry_scheduler, daemon=True)
     scheduler.start()
+    start_retry_promoter([webhook_queue])
 
     while running:
-        item = redis_client.blpop(QUEUE_NAME, timeout=5)
-        if not item:
+        if not slots.acquire(timeout=1):
             continue
 
-        _, payload = item
-        try:
-            job = json.loads(payload)
-            merchant_id = job.get("merchant_id")
-            event = job.get("event")
-            data_payload = job.get("payload")
-
-            if not merchant_id:
-                print("❌ Missing merchant_id in job")
-                continue
+        item = webhook_queue.dequeue(timeout=5)
+        if not item:
+            slots.release()
+            continue
 
-            db = SessionLocal()
-            try:
-                # Create initial log
-                log = WebhookLog(
-                    merchant_id=merchant_id,
-                    event=event,
-                    payload=data_payload,
-                    status="pending",
-                    attempts=0,
-                    next_retry_at=datetime.utcnow() # Immediate
-                )
-                db.add(log)
-                db.commit()
-                db.refresh(log)
-
-                # Process immediately
-                deliver_webhook(db, log.id)
-            finally:
-                db.close()
+        executor.submit(_run_job, item)
 
-        except Exception as e:
-            print(f"⚠️ Webhook worker error: {e}")
+    executor.shutdown(wait=True)
+    get_delivery_engine().close()
+    print("🛑 Webhook worker stopped")
 
 def graceful_shutdown(signum, frame):
     global running
@@ -204,9 +450,6 @@ signal.signal(signal.SIGINT, graceful_shutdown)
 signal.signal(signal.SIGTERM, graceful_shutdown)
 
 if __name__ == "__main__":
-    try:
-        from migrate import migrate
-        migrate()
-    except Exception as e:
-        print(f"⚠️ Migration failed: {e}")
+    from migrate import ensure_schema
+    ensure_schema()
     worker_loop()
\ No newline at end of file
@@ -4,10 +4,18 @@ import redis
 import json
 import random
 import signal
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models.payment import Payment
 from models.order import Order
+from utils.job_queue import get_queue
+from utils.retry import RetryPolicy, TerminalError, is_retryable, schedule_retry, start_retry_promoter
+from utils.metrics import record_metrics, payment_outcome
+from utils.payment_events import publish_payment_status
+from utils.read_cache import invalidate
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 QUEUE_NAME = os.getenv("WORKER_QUEUE", "gateway_jobs")
@@ -15,17 +23,30 @@ DLQ_QUEUE = os.getenv("DLQ_QUEUE", "gateway_jobs_dlq")
 WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "gateway_webhooks")
 
 MAX_RETRIES = int(os.getenv("WORKER_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("WORKER_RETRY_BASE_DELAY_SEC", "2"))
+RETRY_MAX_DELAY = float(os.getenv("WORKER_RETRY_MAX_DELAY_SEC", "60"))
 TEST_MODE = os.getenv("TEST_MODE", "true").lower() == "true"
 TEST_PROCESSING_DELAY = int(os.getenv("TEST_PROCESSING_DELAY", "1000"))
 TEST_PAYMENT_SUCCESS = os.getenv("TEST_PAYMENT_SUCCESS", "true").lower() == "true"
 
+# Max payments in flight per process. 1 keeps the old one-at-a-time behaviour.
+WORKER_CONCURRENCY = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+
 redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+payment_queue = get_queue(QUEUE_NAME, dlq=DLQ_QUEUE, client=redis_client)
+webhook_queue = get_queue(WEBHOOK_QUEUE, client=redis_client)
+retry_policy = RetryPolicy(MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY)
 running = True
 
+executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="payment")
+slots = threading.BoundedSemaphore(WORKER_CONCURRENCY)
+in_flight = 0
+in_flight_lock = threading.Lock()
+
 
 def graceful_shutdown(signum, frame):
     global running
-    print("🛑 Payment worker shutting down...")
+    print(f"🛑 Payment worker shutting down, draining {in_flight} in-flight payment(s)...")
     running = False
 
 
@@ -33,22 +54,36 @@ signal.signal(signal.SIGINT, graceful_shutdown)
 signal.signal(signal.SIGTERM, graceful_shutdown)
 
 
+FINAL_STATUSES = ("success", "failed")
+
+
 def process_payment(payment_id: str) -> bool:
+    """
+    Returns the payment outcome. A decline is a normal outcome, not an error;
+    exceptions are left to the caller to classify as retryable or terminal.
+    """
     db: Session = SessionLocal()
     try:
         payment = db.query(Payment).filter(Payment.id == payment_id).first()
         if not payment:
-            print(f"❌ Payment {payment_id} not found")
-            return False
+            raise TerminalError(f"Payment {payment_id} not found")
 
         order = db.query(Order).filter(Order.id == payment.order_id).first()
         if not order:
-            print(f"❌ Order {payment.order_id} not found")
-            return False
+            raise TerminalError(f"Order {payment.order_id} not found")
+
+        # Redelivered job (retry or reclaimed entry) for a payment that already
+        # settled: don't charge again, only make sure the webhook goes out.
+        if payment.status.lower() in FINAL_STATUSES:
+            enqueue_payment_webhook(payment)
+            return payment.status.lower() == "success"
 
         payment.status = "PROCESSING"
         db.commit()
-        print(f"⚙️ Processing payment {payment.id}")
+        invalidate(redis_client, payment_ids=[payment_id])
+        # Don't touch expired attributes before the delay: that would reopen
+        # a transaction and pin a pooled connection for the whole sleep.
+        print(f"⚙️ Processing payment {payment_id}")
 
         # -----------------------------
         # Delay
@@ -78,74 +113,112 @@ def process_payment(payment_id: str) -> bool:
             order.status = "failed"
             print(f"❌ Payment {payment.id} FAILED")
 
+        latency = (datetime.now(timezone.utc) - payment.created_at).total_seconds() if payment.created_at else None
+        record_metrics(db, payment.merchant_id, **payment_outcome(success, latency))
         db.commit()
 
-        # -----------------------------
-        # Enqueue Webhook
-        # -----------------------------
-        webhook_payload = {
-            "event": f"payment.{payment.status}",
-            "timestamp": int(time.time()),
-            "data": {
-                "payment": {
-                    "id": payment.id,
-                    "order_id": payment.order_id,
-                    "amount": payment.amount,
-                    "currency": payment.currency,
-                    "method": payment.method,
-                    "vpa": payment.vpa,
-                    "status": payment.status,
-                    "created_at": payment.created_at.isoformat() if payment.created_at else None,
-                }
+        invalidate(redis_client, payment_ids=[payment.id], order_ids=[payment.order_id])
+        publish_payment_status(redis_client, payment)
+        enqueue_payment_webhook(payment)
+
+        return success
+    finally:
+        db.close()
+
+
+def enqueue_payment_webhook(payment):
+    webhook_payload = {
+        "event": f"payment.{payment.status}",
+        "timestamp": int(time.time()),
+        "data": {
+            "payment": {
+                "id": payment.id,
+                "order_id": payment.order_id,
+                "amount": payment.amount,
+                "currency": payment.currency,
+                "method": payment.method,
+                "vpa": payment.vpa,
+                "status": payment.status,
+                "created_at": payment.created_at.isoformat() if payment.created_at else None,
             }
         }
+    }
 
-        redis_client.rpush(WEBHOOK_QUEUE, json.dumps({
-            "merchant_id": payment.merchant_id,
-            "event": f"payment.{payment.status}",
-            "payload": webhook_payload
-        }))
+    webhook_queue.enqueue(json.dumps({
+        "merchant_id": payment.merchant_id,
+        "event": f"payment.{payment.status}",
+        "payload": webhook_payload
+    }))
 
-        return success
+
+def handle_job(payload: str):
+    try:
+        job = json.loads(payload)
+    except json.JSONDecodeError:
+        redis_client.rpush(DLQ_QUEUE, payload)
+        return
+
+    payment_id = job.get("payment_id")
+    retries = job.get("retries", 0)
+
+    if not payment_id:
+        redis_client.rpush(DLQ_QUEUE, payload)
+        return
+
+    try:
+        process_payment(payment_id)
+    except Exception as e:
+        delay = retry_policy.delay_for(retries + 1) if is_retryable(e) else None
+        if delay is None:
+            job["error"] = str(e)
+            redis_client.rpush(DLQ_QUEUE, json.dumps(job))
+            print(f"⚠️ Payment {payment_id} moved to DLQ: {e}")
+        else:
+            job["retries"] = retries + 1
+            schedule_retry(payment_queue, json.dumps(job), delay)
+            print(f"🔁 Retry {job['retries']} for payment {payment_id} in {delay:.1f}s: {e}")
+
+
+def _run_job(job):
+    global in_flight
+    try:
+        handle_job(job.payload)
+    except Exception as e:
+        print(f"⚠️ Payment job error: {e}")
+        redis_client.rpush(DLQ_QUEUE, job.payload)
     finally:
-        db.close()
+        # Ack only once the job reached a final place (done, re-queued or DLQ)
+        payment_queue.ack(job)
+        with in_flight_lock:
+            in_flight -= 1
+        slots.release()
 
 
 def worker_loop():
-    print("🟢 Payment worker started")
+    global in_flight
+    print(f"🟢 Payment worker started (concurrency={WORKER_CONCURRENCY})")
+    start_retry_promoter([payment_queue])
     while running:
-        item = redis_client.blpop(QUEUE_NAME, timeout=5)
-        if not item:
+        # Only pull a job once a slot is free, so at most
+        # WORKER_CONCURRENCY jobs ever leave the queue for this process.
+        if not slots.acquire(timeout=1):
             continue
 
-        _, payload = item
-
-        try:
-            job = json.loads(payload)
-        except json.JSONDecodeError:
-            redis_client.rpush(DLQ_QUEUE, payload)
-            continue
-
-        payment_id = job.get("payment_id")
-        retries = job.get("retries", 0)
-
-        if not payment_id:
-            redis_client.rpush(DLQ_QUEUE, payload)
+        job = payment_queue.dequeue(timeout=5)
+        if not job:
+            slots.release()
             continue
 
-        success = process_payment(payment_id)
+        with in_flight_lock:
+            in_flight += 1
+        executor.submit(_run_job, job)
 
-        if not success:
-            if retries < MAX_RETRIES:
-                job["retries"] = retries + 1
-                redis_client.rpush(QUEUE_NAME, json.dumps(job))
-                print(f"🔁 Retry {job['retries']} for payment {payment_id}")
-            else:
-                redis_client.rpush(DLQ_QUEUE, json.dumps(job))
-                print(f"⚠️ Payment {payment_id} moved to DLQ")
+    # Drain: finish every payment already taken off the queue
+    executor.shutdown(wait=True)
+    print("🛑 Payment worker stopped")
 
 
 if __name__ == "__main__":
-    from migrate import migrate
-    migrate()
-    worker_loop()
\ No newline at end of file
+    from migrate import ensure_schema
+    ensure_schema()
+    worker_loop()
@@ -27,29 +27,35 @@ export default function Checkout() {
       .catch(() => { setStatus(STATUS.FAILED); setErrorMessage("Invalid order"); });
   }, [orderId]);
 
-  // poll payment
+  // stream payment status (SSE); the API pushes the result as soon as the worker has it
   useEffect(() => {
     if (!paymentId || status !== STATUS.PROCESSING) return;
-    const interval = setInterval(async () => {
-      try {
-        const res = await axios.get(`${API_BASE}/payments/public/${paymentId}`);
-        if (res.data.status === "SUCCESS") {
-          setStatus(STATUS.SUCCESS);
-          window.parent.postMessage({ type: "PAYMENT_SUCCESS", payload: res.data }, "*");
-          clearInterval(interval);
-        }
-        if (res.data.status === "FAILED") {
-          setStatus(STATUS.FAILED);
-          window.parent.postMessage({ type: "PAYMENT_FAILED", payload: res.data }, "*");
-          clearInterval(interval);
-        }
-      } catch {
-        setStatus(STATUS.FAILED);
-        window.parent.postMessage({ type: "PAYMENT_FAILED" }, "*");
-        clearInterval(interval);
-      }
-    }, 2000);
-    return () => clearInterval(interval);
+    let source;
+
+    const finish = (next, type, payload) => {
+      setStatus(next);
+      window.parent.postMessage(payload ? { type, payload } : { type }, "*");
+      source.close();
+    };
+
+    const connect = () => {
+      source = new EventSource(`${API_BASE}/payments/public/${paymentId}/events`);
+      source.addEventListener("status", (e) => {
+        const payment = JSON.parse(e.data);
+        const paymentStatus = (payment.status || "").toUpperCase();
+        if (paymentStatus === "SUCCESS") finish(STATUS.SUCCESS, "PAYMENT_SUCCESS", payment);
+        if (paymentStatus === "FAILED") finish(STATUS.FAILED, "PAYMENT_FAILED", payment);
+      });
+      // Server closes long-waiting streams; open a fresh one
+      source.addEventListener("timeout", () => { source.close(); connect(); });
+      source.onerror = () => {
+        // EventSource retries on its own unless the server rejected the stream
+        if (source.readyState === EventSource.CLOSED) finish(STATUS.FAILED, "PAYMENT_FAILED");
+      };
+    };
+
+    connect();
+    return () => source && source.close();
   }, [paymentId, status]);
 
   const createPayment = async (payload) => {
@@ -57,7 +63,7 @@ export default function Checkout() {
     setErrorMessage("");
     try {
       const res = await axios.post(`${API_BASE}/payments/public`, payload);
-      setPaymentId(res.data.id); // ✅ use payment id for polling
+      setPaymentId(res.data.id); // ✅ use payment id for the status stream
     } catch {
       setStatus(STATUS.FAILED);
       setErrorMessage("Payment failed");
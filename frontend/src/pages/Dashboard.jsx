@@ -25,18 +25,14 @@ export default function Dashboard() {
       setApiKey(api_key);
       setApiSecret(api_secret);
 
-      const paymentsRes = await api.get("/payments");
-      const payments = paymentsRes.data;
-      const total = payments.length;
-      const success = payments.filter(p => p.status === "success").length;
-      const amount = payments
-        .filter(p => p.status === "success")
-        .reduce((sum, p) => sum + p.amount, 0);
+      // Totals over every payment, aggregated server-side
+      const statsRes = await api.get("/admin/stats");
+      const payments = statsRes.data.payments;
 
       setStats({
-        totalTransactions: total,
-        totalAmount: amount,
-        successRate: total > 0 ? Math.round((success / total) * 100) : 0,
+        totalTransactions: payments.total,
+        totalAmount: payments.success_amount,
+        successRate: Math.round(payments.success_rate_pct),
       });
 
       fetchWebhooks();
@@ -55,8 +51,8 @@ export default function Dashboard() {
 
   async function fetchLogs() {
     try {
-      const res = await api.get("/webhook-logs");
-      setLogs(res.data);
+      const res = await api.get("/webhook-logs", { params: { limit: 50 } });
+      setLogs(res.data.data);
     } catch (err) { console.error(err); }
   }
 
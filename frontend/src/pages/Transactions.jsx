@@ -3,14 +3,23 @@ import api from "../api";
 
 export default function Transactions() {
   const [payments, setPayments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  useEffect(() => {
-    api.get("/payments")
-      .then(res => setPayments(res.data))
+  function loadPage(cursor) {
+    api.get("/payments", { params: { limit: 50, cursor: cursor || undefined } })
+      .then(res => {
+        setPayments(prev => (cursor ? [...prev, ...res.data.data] : res.data.data));
+        setNextCursor(res.data.next_cursor);
+      })
       .catch(err => console.error("Failed to load payments", err));
+  }
+
+  useEffect(() => {
+    loadPage(null);
   }, []);
 
   return (
+    <>
     <table data-test-id="transactions-table">
       <thead>
         <tr>
@@ -37,5 +46,9 @@ export default function Transactions() {
         ))}
       </tbody>
     </table>
+    {nextCursor && (
+      <button data-test-id="load-more" onClick={() => loadPage(nextCursor)}>Load more</button>
+    )}
+    </>
   );
 }
\ No newline at end of file